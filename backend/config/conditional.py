@@ -0,0 +1,127 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from django.core.cache import cache
+from django.db.models import Max
+from django.db.models.signals import post_delete
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+DELETED_AT_KEY = 'conditional:deleted_at:{}'
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def _mark_deleted(sender, **kwargs):
+    cache.set(DELETED_AT_KEY.format(sender._meta.label), time.time_ns(), None)
+
+
+def track_deletions(*models):
+    """
+    Удаление не меняет max(updated_at) - время последнего удаления
+    хранится в общем кеше и входит в отпечаток
+    """
+    for model in models:
+        post_delete.connect(_mark_deleted, sender=model, dispatch_uid=f'conditional:{model._meta.label}')
+
+
+def get_models_fingerprint(models):
+    """
+    Отпечаток состояния таблиц: max(updated_at) каждой модели (для моделей
+    без updated_at - max(pk)) и время последнего удаления из кеша.
+    Возвращает (строка отпечатка, время последнего изменения).
+    """
+    deleted = cache.get_many([DELETED_AT_KEY.format(model._meta.label) for model in models])
+    parts = []
+    last_modified = None
+    for model in models:
+        deleted_at = deleted.get(DELETED_AT_KEY.format(model._meta.label))
+        field_names = {field.name for field in model._meta.concrete_fields}
+        if 'updated_at' in field_names:
+            updated = model._default_manager.aggregate(value=Max('updated_at'))['value']
+        else:
+            # Таблицы без updated_at пересобираются целиком - новые строки дают новый max(pk)
+            updated = model._default_manager.aggregate(value=Max('pk'))['value']
+        parts.append(f'{model._meta.label}:{updated}:{deleted_at}')
+
+        moments = [
+            updated if isinstance(updated, datetime) else None,
+            datetime.fromtimestamp(deleted_at / 1e9, timezone.utc) if deleted_at else None,
+        ]
+        for moment in moments:
+            if moment and (last_modified is None or moment > last_modified):
+                last_modified = moment
+    return '|'.join(parts), last_modified
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для GET/HEAD по updated_at моделей из conditional_models.
+    Проверка If-None-Match / If-Modified-Since выполняется после аутентификации
+    и проверки прав, но до запросов данных и сериализации - при совпадении
+    сразу отдается 304.
+    """
+    conditional_models = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        track_deletions(*cls.conditional_models)
+
+    def get_conditional_models(self):
+        return self.conditional_models
+
+    def get_conditional_fingerprint(self):
+        """
+        (отпечаток, время изменения) или None - без проверки. Переопределяется,
+        если состояние данных известно без запросов к БД (версия в кеше)
+        """
+        models = self.get_conditional_models()
+        return get_models_fingerprint(models) if models else None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._conditional = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        fingerprint = self.get_conditional_fingerprint()
+        if fingerprint is None:
+            return
+
+        fingerprint, last_modified = fingerprint
+        renderer = getattr(request, 'accepted_renderer', None)
+        raw = '|'.join([
+            fingerprint,
+            request.get_full_path(),
+            renderer.format if renderer else '',
+            'staff' if request.user.is_staff else '',
+        ])
+        etag = '"{}"'.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        self._conditional = (etag, last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        conditional = getattr(self, '_conditional', None)
+        if conditional and response.status_code in (200, 304):
+            etag, last_modified = conditional
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Кешировать можно, но перед использованием - всегда перепроверять
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 5)
+TAG_KEY = 'respcache:tag:{}'
+ENTRY_KEY = 'respcache:entry:{}'
+
+
+class CachedResponse(Exception):
+    """Прерывает обработку запроса ответом из кеша"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def get_tag_versions(tags):
+    """Текущие версии тегов; отсутствующие создаются (значение от времени)"""
+    keys = {tag: TAG_KEY.format(tag) for tag in tags}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        versions[tag] = version
+    return versions
+
+
+def invalidate_cache_tags(*tags):
+    """
+    Сброс всех закешированных ответов с любым из тегов: новая версия тега.
+    Выполняется после коммита - чтобы следующий запрос уже видел новые данные.
+    Работает на любом бэкенде кеша (locmem, Redis): записи не перебираются.
+    """
+    tags = {tag for tag in tags if tag}
+    if tags:
+        transaction.on_commit(lambda: cache.set_many(
+            {TAG_KEY.format(tag): time.time_ns() for tag in tags}, None
+        ))
+
+
+class ResponseCacheMixin:
+    """
+    Кеш готовых ответов для анонимных GET-запросов. Ключ - схема, хост, путь,
+    отсортированные query params и формат ответа; запись помечается тегами
+    из get_cache_tags() и считается устаревшей, если версия любого тега изменилась.
+    Ставится перед ConditionalGetMixin, чтобы 304 проверялся раньше кеша.
+    """
+    cache_tags = []
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+    # Действия со своим кешированием (готовые сжатые ответы и т.п.)
+    cache_exempt_actions = []
+
+    def get_cache_tags(self, request, response):
+        """Теги ответа - переопределяется для точечной инвалидации (product:42)"""
+        return self.cache_tags
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, value)
+            for key in request.query_params.keys()
+            for value in request.query_params.getlist(key)
+        )
+        renderer = getattr(request, 'accepted_renderer', None)
+        # Хост и схема входят в ключ: в ответах абсолютные URL (изображения)
+        raw = repr((request.scheme, request.get_host(), request.path, params, renderer.format if renderer else ''))
+        return ENTRY_KEY.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def _response_cache_enabled(self, request):
+        return (
+            request.method == 'GET' and not request.user.is_authenticated
+            and getattr(self, 'action', None) not in self.cache_exempt_actions
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._response_cache_key = None
+        if not self._response_cache_enabled(request):
+            return
+
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and get_tag_versions(entry['tags']) == entry['tags']:
+            response = HttpResponse(entry['content'], status=entry['status'],
+                                    content_type=entry['content_type'])
+            response['X-Cache'] = 'HIT'
+            raise CachedResponse(response)
+        self._response_cache_key = key
+        self._response_cache_started = time.time_ns()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CachedResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        key = getattr(self, '_response_cache_key', None)
+        tags = None
+        if key and response.status_code == 200 and not response.cookies:
+            tags = self.get_cache_tags(request, response)
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if tags:
+            versions = get_tag_versions(tags)
+            # Тег сброшен во время обработки - ответ мог собраться из старых данных
+            if any(version > self._response_cache_started for version in versions.values()):
+                return response
+            timeout = self.cache_timeout
+
+            def store(rendered):
+                cache.set(key, {
+                    'tags': versions,
+                    'content': rendered.content,
+                    'status': rendered.status_code,
+                    'content_type': rendered['Content-Type'],
+                }, timeout)
+
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
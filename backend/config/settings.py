@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party
     'rest_framework',
@@ -121,6 +122,58 @@ DATABASES = {
     }
 }
 
+# Cache - Redis from Docker (REDIS_URL), иначе локальная память процесса
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'gipsum',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gipsum',
+        }
+    }
+
+# Время жизни закешированного дерева категорий (сбрасывается при изменениях)
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Время жизни кеша витрины "товары по категориям" для анонимных запросов
+PRODUCTS_BY_CATEGORY_CACHE_TIMEOUT = 60
+
+# Время жизни кеша подсказок автодополнения (по префиксу запроса)
+AUTOCOMPLETE_CACHE_TIMEOUT = 60 * 5
+
+# Фасеты каталога: границы ценовых корзин и время жизни кеша
+PRODUCT_FACET_PRICE_BUCKETS = [0, 500, 1000, 2500, 5000, 10000]
+PRODUCT_FACETS_CACHE_TIMEOUT = 60 * 5
+
+# Похожие товары (products/related.py): сколько хранить на товар и веса оценки
+RELATED_PRODUCTS_LIMIT = 8
+RELATED_PRODUCTS_WEIGHTS = {'categories': 1.0, 'price': 0.5, 'copurchase': 2.0}
+
+# "Покупают вместе" (manage.py build_copurchase_matrix): соседей на товар
+COPURCHASE_TOP_K = 20
+
+# Кеш готовых ответов API для анонимных GET (config/response_cache.py),
+# сбрасывается тегами из сигналов
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+# Импорт товаров (products/import_service.py): строк в одной пачке/транзакции
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+# Импорт без отметки воркера дольше этого времени забирает другой воркер
+PRODUCT_IMPORT_STALE_AFTER = 60 * 30
+# Параллельное скачивание изображений импорта (products/image_fetcher.py)
+PRODUCT_IMPORT_IMAGE_WORKERS = 16
+PRODUCT_IMPORT_IMAGE_PER_HOST = 4
+# Экспорт товаров (products/export_service.py): товаров за одно чтение курсора
+PRODUCT_EXPORT_CHUNK_SIZE = 2000
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
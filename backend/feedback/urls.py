@@ -5,7 +5,8 @@ from .views import FeedbackViewSet, FeedbackConfigView
 router = DefaultRouter()
 router.register(r'', FeedbackViewSet, basename='feedback')
 
+# config/ раньше роутера - иначе его перехватывает маршрут детального обращения
 urlpatterns = [
-    path('', include(router.urls)),
     path('config/', FeedbackConfigView.as_view(), name='feedback-config'),
+    path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -66,13 +66,9 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         # Сохраняем URL политики из настроек, если не передан
         privacy_url = request.data.get('privacy_policy_url', '')
         if not privacy_url:
-            # Получаем из настроек site_settings
-            from site_settings.models import SiteSetting
-            try:
-                setting = SiteSetting.objects.get(key='privacy_policy_url')
-                privacy_url = setting.get_value() or ''
-            except SiteSetting.DoesNotExist:
-                privacy_url = ''
+            # Получаем из реестра настроек site_settings (без запроса к БД)
+            from site_settings.registry import get_setting_value
+            privacy_url = get_setting_value('privacy_policy_url') or ''
         
         # Создаем обращение
         feedback = serializer.save(privacy_policy_url=privacy_url)
@@ -350,14 +346,9 @@ class FeedbackConfigView(generics.GenericAPIView):
     
     def get(self, request):
         # Получаем настройки
-        from site_settings.models import SiteSetting
+        from site_settings.registry import get_setting_value
         
-        privacy_url = ''
-        try:
-            setting = SiteSetting.objects.get(key='privacy_policy_url')
-            privacy_url = setting.get_value() or ''
-        except SiteSetting.DoesNotExist:
-            pass
+        privacy_url = get_setting_value('privacy_policy_url') or ''
         
         # Типы обращений
         message_types = [
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class GalleriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'galleries'
-    verbose_name = 'Галереи'
\ No newline at end of file
+    verbose_name = 'Галереи'
+
+    def ready(self):
+        from . import signals  # noqa: F401
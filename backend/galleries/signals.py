@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from config.response_cache import invalidate_cache_tags
+from .models import Gallery, GalleryImage
+
+
+def _invalidate_gallery(gallery_id):
+    invalidate_cache_tags('galleries', f'gallery:{gallery_id}')
+
+
+@receiver(post_save, sender=Gallery)
+@receiver(post_delete, sender=Gallery)
+def gallery_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _invalidate_gallery(instance.pk)
+
+
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_delete, sender=GalleryImage)
+def gallery_image_changed(sender, instance, raw=False, **kwargs):
+    # У изображений нет updated_at - изменение отмечается на галерее (ETag)
+    if raw:
+        return
+    Gallery.objects.filter(pk=instance.gallery_id).update(updated_at=timezone.now())
+    _invalidate_gallery(instance.gallery_id)
@@ -3,6 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.shortcuts import get_object_or_404
+from config.conditional import ConditionalGetMixin
+from config.response_cache import ResponseCacheMixin
 from .models import Gallery, GalleryImage
 from .serializers import (
     GalleryListSerializer,
@@ -12,7 +14,7 @@ from .serializers import (
 )
 
 
-class GalleryViewSet(viewsets.ReadOnlyModelViewSet):
+class GalleryViewSet(ResponseCacheMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для галерей.
     Доступно всем без авторизации (только чтение).
@@ -20,6 +22,19 @@ class GalleryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Gallery.objects.filter(is_active=True)
     lookup_field = 'slug'
     permission_classes = [AllowAny]
+    # Изменения изображений обновляют updated_at галереи (galleries/signals.py)
+    conditional_models = [Gallery]
+    cache_tags = ['galleries']
+
+    def get_cache_tags(self, request, response):
+        if self.action in ['retrieve', 'render']:
+            return [f'gallery:{self._cache_gallery_id}']
+        return self.cache_tags
+
+    def get_object(self):
+        gallery = super().get_object()
+        self._cache_gallery_id = gallery.pk
+        return gallery
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -100,13 +115,14 @@ class GalleryViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class GalleryImageViewSet(viewsets.ReadOnlyModelViewSet):
+class GalleryImageViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для изображений галерей.
     """
     queryset = GalleryImage.objects.filter(is_active=True)
     serializer_class = GalleryImageSerializer
     permission_classes = [AllowAny]
+    conditional_models = [Gallery]
 
     def get_queryset(self):
         queryset = super().get_queryset()
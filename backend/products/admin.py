@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Category, Product, ProductImage
+from .export_service import ProductExportService
 
 
 class ProductImageInline(admin.TabularInline):
@@ -29,10 +30,9 @@ class CategoryAdmin(admin.ModelAdmin):
     raw_id_fields = ['parent']
     
     def product_count(self, obj):
-        count = obj.products.filter(is_available=True).count()
         return format_html(
             '<a href="/admin/products/product/?categories__id={}">{} товаров</a>',
-            obj.id, count
+            obj.id, obj.direct_product_count
         )
     product_count.short_description = 'Товаров'
 
@@ -54,6 +54,7 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductImageInline]
     list_editable = ['price', 'stock', 'is_available', 'is_featured']
     date_hierarchy = 'created_at'
+    actions = ['export_csv_action', 'export_xlsx_action', 'export_jsonl_action']
     
     fieldsets = (
         ('Основное', {
@@ -85,6 +86,22 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def _export(self, queryset, export_format):
+        """Выбранные товары файлом в формате импорта (products/export_service.py)"""
+        return ProductExportService(queryset.order_by('pk')).response(export_format)
+    
+    def export_csv_action(self, request, queryset):
+        return self._export(queryset, 'csv')
+    export_csv_action.short_description = '📤 Экспорт выбранных в CSV'
+    
+    def export_xlsx_action(self, request, queryset):
+        return self._export(queryset, 'xlsx')
+    export_xlsx_action.short_description = '📤 Экспорт выбранных в Excel (XLSX)'
+    
+    def export_jsonl_action(self, request, queryset):
+        return self._export(queryset, 'jsonl')
+    export_jsonl_action.short_description = '📤 Экспорт выбранных в JSONL'
     # Импорт и регистрация моделей импорта (УДАЛИТЕ старый код и замените на этот)
 try:
     from .import_admin import ProductImportAdmin, ProductImportLogAdmin
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'  # Без apps.
-    verbose_name = 'Товары'
\ No newline at end of file
+    verbose_name = 'Товары'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,129 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from config.response_cache import get_tag_versions
+from .models import Category, Product
+from .serializers import CategoryTreeSerializer, CategoryListSerializer, ProductListSerializer
+
+
+CATEGORY_TREE_VERSION_KEY = 'products:category_tree:version'
+CATEGORY_TREE_TIMEOUT = getattr(settings, 'CATEGORY_TREE_CACHE_TIMEOUT', 60 * 60 * 24)
+# Витрина "товары по категориям" зависит от товаров, поэтому живет недолго
+PRODUCTS_BY_CATEGORY_TIMEOUT = getattr(settings, 'PRODUCTS_BY_CATEGORY_CACHE_TIMEOUT', 60)
+PRODUCTS_BY_CATEGORY_LIMIT = 5
+
+# Копия последнего JSON в памяти процесса: {name: (version, payload)}
+_local_payloads = {}
+
+
+def get_category_tree_version():
+    """Текущая версия дерева категорий (общая для всех воркеров через cache)"""
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        # Начальное значение от времени: после вытеснения ключа
+        # старые закешированные данные не совпадут с новой версией
+        cache.add(CATEGORY_TREE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY, time.time_ns())
+    return version
+
+
+def bump_category_tree_version():
+    """Инвалидация дерева категорий во всех воркерах"""
+    try:
+        cache.incr(CATEGORY_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATEGORY_TREE_VERSION_KEY, time.time_ns(), None)
+
+
+def _get_or_build(name, builder):
+    version = get_category_tree_version()
+    local = _local_payloads.get(name)
+    if local and local[0] == version:
+        return local[1]
+
+    key = f'products:category_tree:{version}:{name}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = JSONRenderer().render(builder())
+        cache.set(key, payload, CATEGORY_TREE_TIMEOUT)
+    _local_payloads[name] = (version, payload)
+    return payload
+
+
+def _build_tree():
+    children_map = Category.get_children_map()
+    return CategoryTreeSerializer(
+        children_map.get(None, []), many=True, context={'children_map': children_map}
+    ).data
+
+
+def _build_flat():
+    categories = Category.objects.filter(is_active=True).select_related('parent')
+    return CategoryListSerializer(categories, many=True).data
+
+
+def get_category_tree_json():
+    """Готовый JSON полного дерева категорий"""
+    return _get_or_build('tree', _build_tree)
+
+
+def get_category_flat_json():
+    """Готовый JSON плоского списка категорий"""
+    return _get_or_build('flat', _build_flat)
+
+
+def build_products_by_category(limit=PRODUCTS_BY_CATEGORY_LIMIT):
+    """
+    Корневые категории с первыми limit доступными товарами каждой.
+    Товары всех категорий выбираются одним запросом.
+    """
+    children_map = Category.get_children_map()
+    roots = children_map.get(None, [])
+
+    # Активные подкатегории каждого корня (поддерево неактивной исключается)
+    groups = {}
+    for root in roots:
+        category_ids = []
+        stack = [root]
+        while stack:
+            category = stack.pop()
+            category_ids.append(category.pk)
+            stack.extend(children_map.get(category.pk, []))
+        groups[root.pk] = category_ids
+
+    top_ids = Product.objects.filter(is_available=True).top_per_category_group(groups, limit)
+    products = Product.objects.filter(
+        pk__in=[pk for ids in top_ids.values() for pk in ids]
+    ).for_list().in_bulk()
+
+    context = {'category_map': Category.get_category_map()}
+    return [
+        {
+            'category': {
+                'id': category.id,
+                'name': category.name,
+                'slug': category.slug
+            },
+            'products': ProductListSerializer(
+                [products[pk] for pk in top_ids[category.pk]],
+                many=True,
+                context=context
+            ).data
+        }
+        for category in roots
+    ]
+
+
+def get_products_by_category_json():
+    """
+    Готовый JSON витрины по категориям (для анонимных запросов). Ключ - версии
+    дерева категорий и тега товаров: правка товара сразу дает новую витрину
+    """
+    products_version = get_tag_versions(['products'])['products']
+    key = f'products:by_category:{get_category_tree_version()}:{products_version}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = JSONRenderer().render(build_products_by_category())
+        cache.set(key, payload, PRODUCTS_BY_CATEGORY_TIMEOUT)
+    return payload
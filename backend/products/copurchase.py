@@ -0,0 +1,178 @@
+import io
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from config.response_cache import invalidate_cache_tags
+from .models import Product, ProductCoPurchase
+
+
+# Сколько соседей хранить на товар
+COPURCHASE_TOP_K = getattr(settings, 'COPURCHASE_TOP_K', 20)
+# Заказы читаются пачками по chunk_size заказов
+COPURCHASE_CHUNK_SIZE = 5000
+# Корзины больше этого размера (оптовые заказы) не учитываются - шум и O(n^2) пар
+COPURCHASE_MAX_BASKET = 50
+# Сколько пар копить до слияния со счетчиками (ограничивает пиковую память)
+COPURCHASE_MERGE_THRESHOLD = 5_000_000
+
+
+class SparseCounter:
+    """
+    Разреженная матрица счетчиков пар в формате "ключ -> количество":
+    ключ пары (a, b) = a * base + b. Новые пары буферизуются и сливаются
+    через np.unique, как при сложении COO-матриц.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+    def add(self, rows, cols):
+        keys, counts = np.unique(rows * self.base + cols, return_counts=True)
+        self._pending.append((keys, counts))
+        self._pending_size += len(keys)
+        if self._pending_size >= COPURCHASE_MERGE_THRESHOLD:
+            self._merge()
+
+    def _merge(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys, *(keys for keys, _ in self._pending)])
+        counts = np.concatenate([self.counts, *(counts for _, counts in self._pending)])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+    def items(self):
+        """Массивы (строки, столбцы, значения)"""
+        self._merge()
+        return self.keys // self.base, self.keys % self.base, self.counts
+
+
+def _iter_order_chunks(chunk_size, max_product_id):
+    """Пары (заказ, товар) пачками по chunk_size заказов, без отмененных заказов"""
+    from orders.models import Order, OrderItem
+
+    last_id = 0
+    while True:
+        order_ids = list(
+            Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not order_ids:
+            return
+        last_id = order_ids[-1]
+        rows = OrderItem.objects.filter(
+            order_id__gte=order_ids[0],
+            order_id__lte=last_id,
+            product_id__lte=max_product_id,
+        ).exclude(order__status='cancelled').values_list('order_id', 'product_id')
+        lines = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+        if len(lines):
+            yield lines
+
+
+def basket_pairs(lines, max_basket=COPURCHASE_MAX_BASKET):
+    """
+    Все упорядоченные пары товаров внутри каждой корзины, без циклов по заказам.
+    lines - массив (заказ, товар). Возвращает (товары корзин, строки пар, столбцы пар).
+    """
+    # Одна строка на (заказ, товар), отсортировано по заказу
+    lines = np.unique(lines, axis=0)
+    _, starts, sizes = np.unique(lines[:, 0], return_index=True, return_counts=True)
+    in_basket = np.repeat(sizes <= max_basket, sizes)
+    lines = lines[in_basket]
+    _, starts, sizes = np.unique(lines[:, 0], return_index=True, return_counts=True)
+    products = lines[:, 1]
+
+    # Для каждого товара корзины - индексы всех товаров той же корзины
+    element_size = np.repeat(sizes, sizes)
+    element_start = np.repeat(starts, sizes)
+    rows = np.repeat(np.arange(len(products)), element_size)
+    offsets = np.arange(element_size.sum()) - np.repeat(np.cumsum(element_size) - element_size, element_size)
+    cols = np.repeat(element_start, element_size) + offsets
+    distinct = rows != cols
+    return products, products[rows[distinct]], products[cols[distinct]]
+
+
+def top_k_neighbours(rows, cols, counts, frequencies, top_k, min_count=1):
+    """Первые top_k соседей каждой строки по числу совместных заказов"""
+    keep = counts >= min_count
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+    scores = counts / np.sqrt(frequencies[rows] * frequencies[cols])
+
+    order = np.lexsort((cols, -scores, -counts, rows))
+    rows, cols, counts, scores = rows[order], cols[order], counts[order], scores[order]
+
+    # Позиция внутри группы строки: индекс минус индекс начала группы
+    positions = np.arange(len(rows))
+    group_start = np.r_[True, rows[1:] != rows[:-1]] if len(rows) else np.empty(0, dtype=bool)
+    rank = positions - np.maximum.accumulate(np.where(group_start, positions, 0))
+    keep = rank < top_k
+    return rows[keep], cols[keep], counts[keep], scores[keep]
+
+
+def _write_links(rows, cols, counts, scores, batch_size=5000):
+    """Запись связей: COPY в PostgreSQL, bulk_create в остальных БД"""
+    columns = zip(rows.tolist(), cols.tolist(), counts.tolist(), scores.tolist())
+    if connection.vendor == 'postgresql':
+        table = ProductCoPurchase._meta.db_table
+        buffer = io.StringIO()
+        buffer.writelines(f'{row}\t{col}\t{count}\t{score!r}\n' for row, col, count, score in columns)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} (product_id, other_id, orders_count, score) FROM STDIN', buffer
+            )
+        return
+    ProductCoPurchase.objects.bulk_create(
+        (
+            ProductCoPurchase(product_id=row, other_id=col, orders_count=count, score=score)
+            for row, col, count, score in columns
+        ),
+        batch_size=batch_size
+    )
+
+
+def build_copurchase_matrix(chunk_size=COPURCHASE_CHUNK_SIZE, top_k=COPURCHASE_TOP_K,
+                            max_basket=COPURCHASE_MAX_BASKET, min_count=1, progress=None):
+    """
+    Пересчет таблицы "покупают вместе" по всей истории заказов.
+    Заказы читаются пачками, пары считаются векторно, в памяти - только
+    счетчики различных пар и частоты товаров.
+    """
+    max_product_id = Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    base = max_product_id + 1
+    pairs = SparseCounter(base)
+    frequencies = np.zeros(base, dtype=np.int64)
+    stats = {'orders': 0, 'lines': 0, 'pairs': 0, 'links': 0}
+
+    for lines in _iter_order_chunks(chunk_size, max_product_id):
+        products, rows, cols = basket_pairs(lines, max_basket)
+        frequencies += np.bincount(products, minlength=base)
+        pairs.add(rows, cols)
+        stats['orders'] += len(np.unique(lines[:, 0]))
+        stats['lines'] += len(lines)
+        if progress:
+            progress(stats)
+
+    rows, cols, counts = pairs.items()
+    stats['pairs'] = len(rows)
+    rows, cols, counts, scores = top_k_neighbours(rows, cols, counts, frequencies, top_k, min_count)
+
+    with transaction.atomic():
+        ProductCoPurchase.objects.all().delete()
+        _write_links(rows, cols, counts, scores)
+    invalidate_cache_tags('copurchase')
+    stats['links'] = len(rows)
+    return stats
+
+
+def get_bought_together(product, limit=10):
+    """Товары, которые чаще всего покупают вместе с данным"""
+    return Product.objects.filter(
+        copurchased_with__product=product, is_available=True
+    ).order_by('-copurchased_with__orders_count', '-copurchased_with__score', 'pk').for_list()[:limit]
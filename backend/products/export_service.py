@@ -0,0 +1,143 @@
+import csv
+import json
+import tempfile
+from itertools import islice
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from .models import Product, Category, ProductImage
+from .import_service import IMAGE_COLUMNS
+
+
+# Сколько товаров читается из курсора за раз (и одним запросом категорий/изображений)
+EXPORT_CHUNK_SIZE = getattr(settings, 'PRODUCT_EXPORT_CHUNK_SIZE', 2000)
+# Колонки в формате, который принимает ProductImportService
+PRODUCT_FIELDS = [
+    'sku', 'name', 'slug', 'price', 'old_price', 'stock', 'short_description', 'description',
+    'is_available', 'is_featured', 'is_new', 'is_bestseller',
+]
+EXPORT_COLUMNS = PRODUCT_FIELDS + ['categories'] + IMAGE_COLUMNS
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+BOOLEAN_FIELDS = frozenset(['is_available', 'is_featured', 'is_new', 'is_bestseller'])
+
+
+class _Echo:
+    """Буфер csv.writer, который сразу возвращает строку (для потоковой отдачи)"""
+
+    def write(self, value):
+        return value
+
+
+class ProductExportService:
+    """
+    Потоковая выгрузка товаров в CSV, XLSX или JSONL в формате импорта.
+
+    Товары читаются серверным курсором (iterator) пачками по chunk_size,
+    категории и изображения - одним запросом на пачку: память не зависит
+    от числа товаров. Главная категория идет первой (импорт делает первую
+    категорию главной), изображения - в порядке image_1..image_5.
+    """
+
+    def __init__(self, queryset=None, chunk_size: int = None):
+        if queryset is None:
+            queryset = Product.objects.order_by('pk')
+        # Связанные данные читаются пачками, prefetch списка товаров не нужен
+        self.queryset = queryset.select_related(None).prefetch_related(None)
+        self.chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+
+    def rows(self):
+        """Строки [значение] в порядке EXPORT_COLUMNS"""
+        categories = dict(Category.objects.values_list('pk', 'name'))
+        products = self.queryset.values_list('pk', 'main_category_id', *PRODUCT_FIELDS).iterator(
+            chunk_size=self.chunk_size
+        )
+        while True:
+            chunk = list(islice(products, self.chunk_size))
+            if not chunk:
+                return
+            product_ids = [pk for pk, *_ in chunk]
+            links = self._category_links(product_ids)
+            images = self._image_urls(product_ids)
+            for pk, main_category_id, *values in chunk:
+                # Главная категория первой, остальные - по порядку добавления
+                category_ids = sorted(links.get(pk, ()), key=lambda category_id: category_id != main_category_id)
+                urls = images.get(pk, [])[:len(IMAGE_COLUMNS)]
+                yield [
+                    *(self._format(field, value) for field, value in zip(PRODUCT_FIELDS, values)),
+                    ', '.join(categories[category_id] for category_id in category_ids),
+                    *urls,
+                    *[''] * (len(IMAGE_COLUMNS) - len(urls)),
+                ]
+
+    def _category_links(self, product_ids: list) -> dict:
+        through = Product.categories.through
+        links = {}
+        for product_id, category_id in through.objects.filter(
+            product_id__in=product_ids
+        ).order_by('pk').values_list('product_id', 'category_id'):
+            links.setdefault(product_id, []).append(category_id)
+        return links
+
+    def _image_urls(self, product_ids: list) -> dict:
+        """URL изображений товаров: главное первым (image_1), дальше по порядку"""
+        images = {}
+        for product_id, path in ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).order_by('-is_main', 'order', 'pk').values_list('product_id', 'image'):
+            images.setdefault(product_id, []).append(default_storage.url(path))
+        return images
+
+    def _format(self, field: str, value) -> str:
+        if value is None:
+            return ''
+        if field in BOOLEAN_FIELDS:
+            return 'true' if value else 'false'
+        return str(value)
+
+    def iter_csv(self):
+        """CSV частями по строке (utf-8 с BOM, как лог импорта - для Excel)"""
+        writer = csv.writer(_Echo())
+        yield '\ufeff' + writer.writerow(EXPORT_COLUMNS)
+        for row in self.rows():
+            yield writer.writerow(row)
+
+    def iter_jsonl(self):
+        """JSON Lines: объект на товар, ключи - колонки импорта, без пустых значений"""
+        for row in self.rows():
+            data = {column: value for column, value in zip(EXPORT_COLUMNS, row) if value != ''}
+            yield json.dumps(data, ensure_ascii=False) + '\n'
+
+    def write_xlsx(self, output):
+        """
+        XLSX в файл output. write_only: строки сразу пишутся во временный
+        файл openpyxl, а не держатся в памяти листа
+        """
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Товары')
+        sheet.append(EXPORT_COLUMNS)
+        for row in self.rows():
+            sheet.append(row)
+        workbook.save(output)
+
+    def response(self, export_format: str):
+        """HTTP-ответ с файлом выгрузки; CSV и JSONL отдаются по мере чтения из БД"""
+        filename = f'products_{timezone.now():%Y%m%d_%H%M%S}.{export_format}'
+        content_type = EXPORT_FORMATS[export_format]
+        if export_format == 'xlsx':
+            # Архив xlsx собирается целиком - во временном файле, не в памяти
+            output = tempfile.TemporaryFile()
+            self.write_xlsx(output)
+            output.seek(0)
+            return FileResponse(output, as_attachment=True, filename=filename, content_type=content_type)
+
+        content = self.iter_csv() if export_format == 'csv' else self.iter_jsonl()
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
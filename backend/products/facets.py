@@ -0,0 +1,195 @@
+import hashlib
+import json
+import math
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, JSONField, Max, Min, Q, Value
+from django.db.models.fields.json import KeyTransform, KeyTransformExact
+from config.response_cache import get_tag_versions
+from .models import ProductAttributeValue
+
+
+# Границы ценовых корзин: [0, 500), [500, 1000), ..., [10000, +inf)
+PRICE_BUCKETS = getattr(settings, 'PRODUCT_FACET_PRICE_BUCKETS', [0, 500, 1000, 2500, 5000, 10000])
+FACETS_CACHE_TIMEOUT = getattr(settings, 'PRODUCT_FACETS_CACHE_TIMEOUT', 60 * 5)
+
+# Параметры, не влияющие на набор товаров (пагинация/сортировка)
+NON_FILTER_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering'}
+
+# Фильтр по значению характеристики из Product.attributes: ?attr_color=Черный
+ATTRIBUTE_PARAM_PREFIX = 'attr_'
+
+
+def _json_values(value: str) -> list:
+    """
+    Значения JSON, текст которых (как в фасетах) равен value: строка,
+    а также число или true/false - {"weight": "5"} не содержится в {"weight": 5}
+    """
+    values = [value]
+    if value in ('true', 'false'):
+        values.append(value == 'true')
+    elif value.strip() == value:
+        try:
+            number = json.loads(value)
+        except ValueError:
+            number = None
+        if isinstance(number, (int, float)) and not isinstance(number, bool) and math.isfinite(number):
+            values.append(number)
+    return values
+
+
+def filter_by_attributes(queryset, params):
+    """Фильтр по JSON-характеристикам товара (?attr_<ключ>=<значение>)"""
+    for param, value in params.items():
+        if not param.startswith(ATTRIBUTE_PARAM_PREFIX) or not value:
+            continue
+        key = param[len(ATTRIBUTE_PARAM_PREFIX):]
+        condition = Q()
+        for json_value in _json_values(value):
+            if connection.vendor == 'postgresql':
+                # @> использует GIN-индекс по attributes - по условию на каждый тип значения
+                condition |= Q(attributes__contains={key: json_value})
+            else:
+                # Ключ из запроса - только имя ключа JSON, не lookup (attr_x__regex)
+                condition |= Q(KeyTransformExact(
+                    KeyTransform(key, 'attributes'), Value(json_value, output_field=JSONField())
+                ))
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def get_facets_cache_key(params, is_staff=False):
+    """
+    Ключ кеша по нормализованному набору фильтров и версиям тегов товаров
+    и категорий (config/response_cache.py): изменения данных дают новый ключ
+    """
+    items = sorted(
+        (key, ','.join(sorted(params.getlist(key))))
+        for key in params.keys()
+        if key not in NON_FILTER_PARAMS
+    )
+    versions = get_tag_versions(['products', 'categories'])
+    raw = repr((items, bool(is_staff), sorted(versions.items())))
+    return 'products:facets:' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _price_buckets():
+    bounds = list(PRICE_BUCKETS) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _aggregate_scalar_facets(queryset):
+    """Количество, флаги, диапазон и корзины цен - одним агрегирующим запросом"""
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=Q(stock__gt=0)),
+        'is_featured': Count('id', filter=Q(is_featured=True)),
+        'is_new': Count('id', filter=Q(is_new=True)),
+        'is_bestseller': Count('id', filter=Q(is_bestseller=True)),
+        'price_min': Min('price'),
+        'price_max': Max('price'),
+    }
+    for index, (low, high) in enumerate(_price_buckets()):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_bucket_{index}'] = Count('id', filter=condition)
+    return queryset.aggregate(**aggregates)
+
+
+def _attribute_value_facets(queryset):
+    """Значения предопределенных характеристик (ProductAttributeValue)"""
+    rows = ProductAttributeValue.objects.filter(
+        product__in=queryset.values('pk')
+    ).values(
+        'attribute__slug', 'attribute__name', 'value'
+    ).annotate(count=Count('id')).order_by('attribute__name', '-count', 'value')
+
+    facets = {}
+    for row in rows:
+        facet = facets.setdefault(row['attribute__slug'], {
+            'slug': row['attribute__slug'],
+            'name': row['attribute__name'],
+            'values': [],
+        })
+        facet['values'].append({'value': row['value'], 'count': row['count']})
+    return list(facets.values())
+
+
+def _json_attribute_facets(queryset):
+    """Значения из Product.attributes (JSON): ключ -> [{value, count}]"""
+    counts = defaultdict(Counter)
+    if connection.vendor == 'postgresql':
+        subquery, params = queryset.values('pk').query.sql_with_params()
+        sql = (
+            'SELECT kv.key, kv.value, COUNT(*) '
+            # Массив, скаляр или null в attributes не роняют jsonb_each_text
+            "FROM products_product p, jsonb_each_text("
+            "CASE WHEN jsonb_typeof(p.attributes) = 'object' THEN p.attributes ELSE '{}'::jsonb END) kv "
+            f"WHERE p.id IN ({subquery}) AND jsonb_typeof(p.attributes) = 'object' "
+            "AND jsonb_typeof(p.attributes -> kv.key) IN ('string', 'number', 'boolean') "
+            'GROUP BY kv.key, kv.value'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for key, value, count in cursor.fetchall():
+                counts[key][value] = count
+    else:
+        for attributes in queryset.values_list('attributes', flat=True).iterator(chunk_size=2000):
+            if not isinstance(attributes, dict):
+                continue
+            for key, value in attributes.items():
+                # Текст значения - как у jsonb_each_text в PostgreSQL (true, а не True)
+                if isinstance(value, bool):
+                    counts[key][json.dumps(value)] += 1
+                elif isinstance(value, (str, int, float)):
+                    counts[key][str(value)] += 1
+
+    return {
+        key: [{'value': value, 'count': count} for value, count in values.most_common()]
+        for key, values in sorted(counts.items())
+    }
+
+
+def compute_facets(queryset):
+    """Все фасеты для отфильтрованного набора товаров"""
+    queryset = queryset.order_by()
+    scalars = _aggregate_scalar_facets(queryset)
+
+    buckets = []
+    for index, (low, high) in enumerate(_price_buckets()):
+        buckets.append({
+            'from': str(Decimal(low)),
+            'to': str(Decimal(high)) if high is not None else None,
+            'count': scalars[f'price_bucket_{index}'],
+        })
+
+    return {
+        'total': scalars['total'],
+        'price': {
+            'min': str(scalars['price_min']) if scalars['price_min'] is not None else None,
+            'max': str(scalars['price_max']) if scalars['price_max'] is not None else None,
+            'buckets': buckets,
+        },
+        'flags': {
+            'in_stock': scalars['in_stock'],
+            'is_featured': scalars['is_featured'],
+            'is_new': scalars['is_new'],
+            'is_bestseller': scalars['is_bestseller'],
+        },
+        'attributes': _attribute_value_facets(queryset),
+        'json_attributes': _json_attribute_facets(queryset),
+    }
+
+
+def get_facets(queryset, params, is_staff=False):
+    """Фасеты с кешем по нормализованным параметрам фильтра"""
+    key = get_facets_cache_key(params, is_staff)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
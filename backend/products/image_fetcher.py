@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .models import ProductImage
+from .import_models import ImportedImage
+
+
+# Сколько изображений скачивается одновременно
+IMAGE_FETCH_WORKERS = getattr(settings, 'PRODUCT_IMPORT_IMAGE_WORKERS', 16)
+# Одновременных запросов к одному хосту - не перегружать сервер поставщика
+IMAGE_FETCH_PER_HOST = getattr(settings, 'PRODUCT_IMPORT_IMAGE_PER_HOST', 4)
+IMAGE_FETCH_TIMEOUT = 30
+
+
+class ImageFetcher:
+    """
+    Параллельное скачивание изображений для импорта.
+
+    Одинаковые URL скачиваются один раз за импорт, соединения переиспользуются
+    (общая сессия с пулом). Скачанные файлы запоминаются в ImportedImage по URL:
+    при повторном импорте запрос условный (If-None-Match/If-Modified-Since),
+    и на 304 используется уже сохраненный файл.
+    """
+
+    def __init__(self, workers: int = None, per_host: int = None,
+                 timeout: float = IMAGE_FETCH_TIMEOUT, session: requests.Session = None):
+        self.workers = workers or IMAGE_FETCH_WORKERS
+        self.per_host = per_host or IMAGE_FETCH_PER_HOST
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='image-fetch')
+        self._host_limits = {}
+        self._results = {}  # url -> путь в хранилище или исключение
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown()
+        self.session.close()
+
+    def get(self, url: str):
+        """Результат уже скачанного URL: путь в хранилище, исключение или None"""
+        return self._results.get(url)
+
+    def fetch_many(self, files: dict, progress=None) -> dict:
+        """
+        Скачивание {url: имя файла} параллельно. Возвращает {url: путь или исключение}.
+        Имя файла используется только если изображение скачивается заново.
+        progress() вызывается в текущем потоке после каждого URL.
+        """
+        new = [url for url in files if url not in self._results]
+        if new:
+            cached = ImportedImage.objects.in_bulk(new, field_name='url')
+            for url in new:
+                host = urlsplit(url).netloc
+                if host not in self._host_limits:
+                    self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            futures = {
+                url: self._pool.submit(self._fetch, url, files[url], cached.get(url))
+                for url in new
+            }
+            fetched = {}
+            for url, future in futures.items():
+                try:
+                    fetched[url] = future.result()
+                except Exception as e:
+                    self._results[url] = Exception(f'Download failed: {e}')
+                if progress is not None:
+                    progress()
+            self._remember(fetched, cached)
+        return {url: self._results[url] for url in files}
+
+    def _fetch(self, url: str, filename: str, cached: ImportedImage | None):
+        """Скачивание одного URL в потоке пула: (путь, ETag, Last-Modified)"""
+        headers = {}
+        if cached and default_storage.exists(cached.path):
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        with self._host_limits[urlsplit(url).netloc]:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and headers:
+            return cached.path, cached.etag, cached.last_modified
+        response.raise_for_status()
+
+        name = ProductImage._meta.get_field('image').generate_filename(None, filename)
+        path = default_storage.save(name, ContentFile(response.content))
+        return path, response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
+
+    def _remember(self, fetched: dict, cached: dict):
+        """Сохранение путей и валидаторов скачанных URL"""
+        now = timezone.now()
+        creates, updates = [], []
+        for url, (path, etag, last_modified) in fetched.items():
+            self._results[url] = path
+            image = cached.get(url)
+            if image is None:
+                creates.append(ImportedImage(
+                    url=url, path=path, etag=etag[:255], last_modified=last_modified[:64], checked_at=now
+                ))
+            else:
+                image.path, image.etag, image.last_modified = path, etag[:255], last_modified[:64]
+                image.checked_at = now
+                updates.append(image)
+        # Тот же URL мог сохранить параллельный импорт
+        ImportedImage.objects.bulk_create(creates, ignore_conflicts=True)
+        ImportedImage.objects.bulk_update(updates, ['path', 'etag', 'last_modified', 'checked_at'])
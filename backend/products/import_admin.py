@@ -1,26 +1,29 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib import messages
+from django.utils import timezone
 from .import_models import ProductImport, ProductImportLog
-from .import_service import ProductImportService
+from .import_worker import apply_dry_run, cancel_import, enqueue_import
 
 
 @admin.register(ProductImport)
 class ProductImportAdmin(admin.ModelAdmin):
     list_display = [
         'id', 'name', 'status_colored', 'import_type', 
-        'total_rows', 'created_count', 'updated_count', 
-        'error_count', 'created_at', 'download_log_button'
+        'total_rows', 'progress', 'created_count', 'updated_count', 
+        'unchanged_count', 'error_count', 'dry_run', 'created_at', 'download_log_button'
     ]
-    list_filter = ['status', 'import_type', 'created_at']
+    list_filter = ['status', 'import_type', 'dry_run', 'created_at']
     search_fields = ['name', 'error_message']
     readonly_fields = [
         'status', 'total_rows', 'created_count', 'updated_count',
         'error_count', 'skipped_count', 'processed_at', 'log_file_link',
-        'error_message_preview'
+        'error_message_preview', 'progress', 'processed_rows', 'started_at',
+        'heartbeat_at', 'worker', 'cancel_requested', 'unchanged_count',
+        'diff_summary_display'
     ]
     date_hierarchy = 'created_at'
-    actions = ['run_import_action']
+    actions = ['run_import_action', 'apply_dry_run_action', 'cancel_import_action']
     
     fieldsets = (
         ('Основное', {
@@ -28,14 +31,16 @@ class ProductImportAdmin(admin.ModelAdmin):
         }),
         ('Настройки импорта', {
             'fields': (
-                'skip_existing', 'update_images', 'default_category'
+                'skip_existing', 'update_images', 'dry_run', 'shards', 'default_category'
             ),
         }),
         ('Результаты импорта', {
             'fields': (
-                'status', 'total_rows', 'created_count', 'updated_count',
-                'error_count', 'skipped_count', 'processed_at',
-                'error_message_preview', 'log_file_link'
+                'status', 'progress', 'total_rows', 'processed_rows',
+                'created_count', 'updated_count', 'unchanged_count', 'diff_summary_display',
+                'error_count', 'skipped_count',
+                'started_at', 'heartbeat_at', 'processed_at', 'worker',
+                'cancel_requested', 'error_message_preview', 'log_file_link'
             ),
             'classes': ('collapse',),
         }),
@@ -52,6 +57,7 @@ class ProductImportAdmin(admin.ModelAdmin):
             'completed': '#4caf50',
             'partial': '#ff9800',
             'error': '#f44336',
+            'cancelled': '#9e9e9e',
         }
         color = colors.get(obj.status, '#9e9e9e')
         return format_html(
@@ -61,6 +67,27 @@ class ProductImportAdmin(admin.ModelAdmin):
         )
     status_colored.short_description = 'Статус'
     
+    def progress(self, obj):
+        if not obj.processed_rows:
+            return '-'
+        text = f'{obj.processed_rows} / {obj.total_rows} ({obj.progress_percent}%)'
+        if obj.status == 'processing':
+            if obj.rows_per_second:
+                text += f', {obj.rows_per_second:.0f} строк/с'
+            if obj.estimated_finish_at:
+                text += ', до ' + timezone.localtime(obj.estimated_finish_at).strftime('%H:%M:%S')
+        return text
+    progress.short_description = 'Прогресс'
+    
+    def diff_summary_display(self, obj):
+        if not obj.diff_summary:
+            return '-'
+        return ', '.join(
+            f'{field}: {count}'
+            for field, count in sorted(obj.diff_summary.items(), key=lambda item: -item[1])
+        )
+    diff_summary_display.short_description = 'Изменения по полям'
+    
     def error_message_preview(self, obj):
         if obj.error_message:
             return format_html(
@@ -89,45 +116,42 @@ class ProductImportAdmin(admin.ModelAdmin):
     download_log_button.short_description = 'Лог'
     
     def run_import_action(self, request, queryset):
-        """Запуск импорта для выбранных записей"""
-        count = 0
-        for import_task in queryset.filter(status='pending'):
-            try:
-                service = ProductImportService(import_task)
-                service.process()
-                count += 1
-            except Exception as e:
-                messages.error(request, f'Ошибка в импорте "{import_task.name}": {e}')
-        
+        """Постановка выбранных импортов в очередь воркера (прерванные продолжатся)"""
+        count = sum(enqueue_import(import_task) for import_task in queryset)
         if count:
-            messages.success(request, f'Успешно обработано импортов: {count}')
+            messages.success(request, f'Поставлено в очередь импортов: {count}')
+        else:
+            messages.warning(request, 'Нет импортов, которые можно запустить')
     run_import_action.short_description = '🚀 Запустить импорт выбранных'
     
+    def apply_dry_run_action(self, request, queryset):
+        """Настоящий импорт для выбранных пробных запусков"""
+        count = sum(apply_dry_run(import_task) for import_task in queryset)
+        if count:
+            messages.success(request, f'Поставлено в очередь импортов: {count}')
+        else:
+            messages.warning(request, 'Среди выбранных нет завершенных пробных запусков')
+    apply_dry_run_action.short_description = '✅ Применить пробный запуск'
+    
+    def cancel_import_action(self, request, queryset):
+        """Отмена выбранных импортов; выполняемый остановится после текущей пачки"""
+        count = sum(cancel_import(import_task) for import_task in queryset)
+        if count:
+            messages.success(request, f'Отменено импортов: {count}')
+    cancel_import_action.short_description = '⏹ Отменить импорт выбранных'
+    
     def save_model(self, request, obj, form, change):
-        """При сохранении автоматически запускаем импорт если статус pending"""
+        """Новый импорт ставится в очередь - его обработает воркер (run_import_worker)"""
         if not change:  # Только при создании
             obj.created_by = request.user
         
         super().save_model(request, obj, form, change)
         
-        # Автозапуск импорта
         if obj.status == 'pending':
-            try:
-                service = ProductImportService(obj)
-                service.process()
-                
-                # Обновляем объект из базы
-                obj.refresh_from_db()
-                
-                if obj.status == 'completed':
-                    messages.success(request, f'✅ Импорт "{obj.name}" успешно завершен! Создано: {obj.created_count}, Обновлено: {obj.updated_count}')
-                elif obj.status == 'partial':
-                    messages.warning(request, f'⚠️ Импорт "{obj.name}" частично завершен. Создано: {obj.created_count}, Ошибок: {obj.error_count}')
-                else:
-                    messages.error(request, f'❌ Импорт "{obj.name}" завершен с ошибками. Подробности в логе.')
-                    
-            except Exception as e:
-                messages.error(request, f'❌ Критическая ошибка импорта: {str(e)[:200]}')
+            messages.info(
+                request,
+                f'Импорт "{obj.name}" поставлен в очередь. Прогресс - в списке импортов.'
+            )
 
 
 @admin.register(ProductImportLog)
@@ -169,6 +193,7 @@ class ProductImportLogAdmin(admin.ModelAdmin):
             'updated': '#2196f3',
             'error': '#f44336',
             'skipped': '#9e9e9e',
+            'unchanged': '#9e9e9e',
         }
         return format_html(
             '<span style="color: {};">● {}</span>',
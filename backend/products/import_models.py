@@ -29,6 +29,7 @@ class ProductImport(models.Model):
         ('completed', 'Завершено'),
         ('partial', 'Частично завершено'),
         ('error', 'Ошибка'),
+        ('cancelled', 'Отменено'),
     ]
     
     IMPORT_TYPE_CHOICES = [
@@ -64,6 +65,37 @@ class ProductImport(models.Model):
     updated_count = models.PositiveIntegerField(default=0, verbose_name='Обновлено')
     error_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
     skipped_count = models.PositiveIntegerField(default=0, verbose_name='Пропущено')
+    unchanged_count = models.PositiveIntegerField(default=0, verbose_name='Без изменений')
+    diff_summary = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Изменения по полям',
+        help_text='Сколько обновленных товаров изменилось по каждому полю'
+    )
+    
+    # Прогресс (обновляется воркером после каждой пачки, см. products/import_worker.py)
+    processed_rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обработано строк',
+        help_text='Строки до этой позиции уже записаны - с нее продолжается прерванный импорт'
+    )
+    rows_per_second = models.FloatField(default=0, verbose_name='Строк в секунду')
+    estimated_finish_at = models.DateTimeField(null=True, blank=True, verbose_name='Ожидаемое завершение')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки')
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя отметка воркера',
+        help_text='Импорт без отметки дольше PRODUCT_IMPORT_STALE_AFTER считается прерванным'
+    )
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Воркер')
+    cancel_requested = models.BooleanField(default=False, verbose_name='Запрошена отмена')
+    shard_progress = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Прогресс процессов',
+        help_text='Сколько своих строк записал каждый процесс (для продолжения)'
+    )
     
     # Логи и ошибки
     log_file = models.FileField(
@@ -83,6 +115,16 @@ class ProductImport(models.Model):
         default=False,
         verbose_name='Обновлять изображения'
     )
+    shards = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name='Параллельных процессов',
+        help_text='Строки делятся между процессами по SKU (только PostgreSQL)'
+    )
+    dry_run = models.BooleanField(
+        default=False,
+        verbose_name='Пробный запуск',
+        help_text='Показать, что изменится, ничего не записывая'
+    )
     default_category = models.ForeignKey(
         'Category',
         on_delete=models.SET_NULL,
@@ -108,6 +150,12 @@ class ProductImport(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_status_display()})"
 
+    @property
+    def progress_percent(self):
+        if not self.total_rows:
+            return 0
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
 
 class ProductImportLog(models.Model):
     """Детальный лог каждой строки импорта"""
@@ -118,6 +166,7 @@ class ProductImportLog(models.Model):
         ('updated', 'Обновлен'),
         ('error', 'Ошибка'),
         ('skipped', 'Пропущен'),
+        ('unchanged', 'Без изменений'),
     ]
     
     import_task = models.ForeignKey(
@@ -136,4 +185,23 @@ class ProductImportLog(models.Model):
     class Meta:
         verbose_name = 'Лог импорта'
         verbose_name_plural = 'Логи импорта'
-        ordering = ['row_number']
\ No newline at end of file
+        ordering = ['row_number']
+
+class ImportedImage(models.Model):
+    """
+    Изображение, скачанное при импорте: файл в хранилище и валидаторы
+    ответа для условного запроса при следующем импорте
+    """
+    
+    url = models.URLField(max_length=1000, unique=True, verbose_name='URL')
+    path = models.CharField(max_length=255, verbose_name='Путь в хранилище')
+    etag = models.CharField(max_length=255, blank=True, verbose_name='ETag')
+    last_modified = models.CharField(max_length=64, blank=True, verbose_name='Last-Modified')
+    checked_at = models.DateTimeField(verbose_name='Проверено')
+
+    class Meta:
+        verbose_name = 'Скачанное изображение'
+        verbose_name_plural = 'Скачанные изображения'
+
+    def __str__(self):
+        return self.url
@@ -0,0 +1,149 @@
+import codecs
+import csv
+import os
+from itertools import islice
+
+
+# Сколько байт начала CSV используется для определения кодировки
+SNIFF_SIZE = 64 * 1024
+# Кодировки в порядке проверки (utf-8-sig понимает и utf-8 без BOM)
+CSV_ENCODINGS = ['utf-8-sig', 'cp1251', 'latin1']
+# Значения ячеек, которые считаются пустыми (как na_values по умолчанию в pandas)
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+class ImportFile:
+    """
+    Потоковое чтение файла импорта: строки читаются по мере обработки,
+    память не зависит от размера файла.
+
+    columns - заголовки (приведены к нижнему регистру), rows(start) - итератор
+    строк-списков начиная со start. Как и прежнее чтение через pandas, пропускает
+    пустые строки CSV и пустые строки в конце листа Excel.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext == '.csv':
+            self.encoding = sniff_encoding(path)
+        elif self.ext not in ['.xlsx', '.xls']:
+            raise ValueError(f"Неподдерживаемый формат: {self.ext}")
+
+        raw = self._iter_raw()
+        header = next(raw, None)
+        raw.close()
+        if header is None:
+            raise ValueError("Файл импорта пуст")
+        self.columns = [str(column).strip().lower() for column in header]
+
+    def rows(self, start: int = 0):
+        """Строки данных [значение или None] начиная со start"""
+        width = len(self.columns)
+        raw = self._iter_raw()
+        next(raw, None)  # заголовок
+        for values in islice(self._data_rows(raw), start, None):
+            yield [None if value in NA_VALUES else value for value in values[:width]]
+
+    def count(self) -> int:
+        """
+        Число строк данных - отдельный проход без разбора значений. Для xlsx
+        берется из размеров листа, если они записаны в файле (могут учитывать
+        пустые строки в конце).
+        """
+        if self.ext == '.xlsx':
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(self.path, read_only=True)
+            max_row = workbook.worksheets[0].max_row
+            workbook.close()
+            if max_row:
+                return max_row - 1
+        raw = self._iter_raw()
+        next(raw, None)
+        return sum(1 for _ in self._data_rows(raw))
+
+    def _data_rows(self, raw):
+        empty = []  # пустые строки листа отдаются, только если дальше есть данные
+        for values in raw:
+            if not values:
+                continue
+            if all(value is None for value in values):
+                empty.append(values)
+                continue
+            yield from empty
+            empty = []
+            yield values
+
+    def _iter_raw(self):
+        if self.ext == '.csv':
+            return self._iter_csv()
+        if self.ext == '.xlsx':
+            return self._iter_xlsx()
+        return self._iter_xls()
+
+    def _iter_csv(self):
+        # Редкие битые байты дальше проверенного начала не прерывают импорт
+        with open(self.path, encoding=self.encoding, errors='replace', newline='') as f:
+            yield from csv.reader(f)
+
+    def _iter_xlsx(self):
+        from openpyxl import load_workbook
+
+        # read_only: лист читается из архива потоково, строка за строкой
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            for values in workbook.worksheets[0].iter_rows(values_only=True):
+                yield [_cell_to_str(value) for value in values]
+        finally:
+            workbook.close()
+
+    def _iter_xls(self):
+        import xlrd
+
+        # Старый .xls ограничен 65536 строками - читается целиком
+        workbook = xlrd.open_workbook(self.path, on_demand=True)
+        try:
+            sheet = workbook.sheet_by_index(0)
+            for index in range(sheet.nrows):
+                yield [_xls_cell_to_str(cell, workbook.datemode) for cell in sheet.row(index)]
+        finally:
+            workbook.release_resources()
+
+
+def sniff_encoding(path: str) -> str:
+    """Кодировка CSV по первым SNIFF_SIZE байтам"""
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_SIZE)
+    for encoding in CSV_ENCODINGS:
+        try:
+            # final=False: многобайтовый символ мог разрезаться на границе образца
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    raise ValueError("Не удалось прочитать CSV файл")
+
+
+def _cell_to_str(value):
+    """Значение ячейки Excel в строку (целые числа без .0, как в pandas)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _xls_cell_to_str(cell, datemode):
+    import xlrd
+
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        return str(xlrd.xldate.xldate_as_datetime(cell.value, datemode))
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return str(bool(cell.value))
+    return _cell_to_str(cell.value)
@@ -1,323 +1,908 @@
-import os
-import re
+import csv
+import io
 import json
-import pandas as pd
-import requests
-from io import BytesIO
-from decimal import Decimal, InvalidOperation
-from django.db import transaction
+import logging
+import tempfile
+import time
+from datetime import timedelta
+from itertools import islice
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.utils import timezone
 from django.utils.text import slugify
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.files.storage import default_storage
+from config.response_cache import invalidate_cache_tags
 from .models import Product, Category, ProductImage
 from .import_models import ProductImport, ProductImportLog
+from .image_fetcher import ImageFetcher
+from .import_reader import ImportFile
+from .import_shards import MAX_IMPORT_SHARDS, plan_import, run_shards
+from .cache import bump_category_tree_version
+from .search import update_search_vectors
+from .related import mark_related_stale
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк файла обрабатывается одной пачкой (одна транзакция)
+IMPORT_CHUNK_SIZE = getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 1000)
+# Поля товара, которые импорт меняет при обновлении
+UPDATE_FIELDS = [
+    'name', 'slug', 'price', 'old_price', 'stock',
+    'is_available', 'is_featured', 'is_new', 'is_bestseller', 'updated_at',
+]
+# Сколько логов читается из БД за раз при записи файла лога
+LOG_FILE_CHUNK_SIZE = 2000
+# Колонки с изображениями: image_1 - главное
+IMAGE_COLUMNS = [f'image_{i}' for i in range(1, 6)]
+ROW_COUNTERS = ['created_count', 'updated_count', 'error_count', 'skipped_count', 'unchanged_count']
+COUNTER_FIELDS = ['total_rows', *ROW_COUNTERS, 'diff_summary']
+# Сохраняются в одной транзакции с пачкой - после сбоя импорт продолжается с processed_rows
+PROGRESS_FIELDS = COUNTER_FIELDS + [
+    'processed_rows', 'shard_progress', 'rows_per_second', 'estimated_finish_at', 'heartbeat_at',
+]
+# Итог импорта. Задача всегда сохраняется по полям: полное сохранение затерло бы
+# cancel_requested и правки из админки, сделанные во время импорта
+FINISH_FIELDS = ['status', 'error_message', 'total_rows', 'estimated_finish_at', 'processed_at']
+# Как часто (сек.) обновляется отметка воркера на долгих шагах между пачками:
+# план деления файла, скачивание изображений
+HEARTBEAT_INTERVAL = 60
+BOOLEAN_TRUE = frozenset(['true', '1', 'yes', 'да', 'д', 'y', '+', 'on', 'вкл'])
+# Без этих полей строка не обрабатывается
+REQUIRED_COLUMNS = ['name', 'price']
+# Текстовые колонки, длину которых ограничивает таблица товаров
+LENGTH_COLUMNS = ['name', 'slug', 'sku', 'short_description']
+
+
+@lru_cache(maxsize=10000)
+def _slugify(value):
+    return slugify(value, allow_unicode=True)
+
+
+# Конвертеры кешируются по строке: в колонках цен, остатков и флагов
+# значения сильно повторяются, каждое разбирается один раз за процесс
+
+@lru_cache(maxsize=10000)
+def _to_decimal(val) -> Decimal | None:
+    """Конвертация в Decimal"""
+    if not val or str(val).lower() in ['nan', 'none', 'null', '']:
+        return None
+    try:
+        cleaned = str(val).replace(',', '.').replace(' ', '').replace('₽', '').replace('$', '')
+        return Decimal(cleaned)
+    except InvalidOperation:
+        return None
+
+
+@lru_cache(maxsize=10000)
+def _to_int(val) -> int | None:
+    """Конвертация в int"""
+    if not val or str(val).lower() in ['nan', 'none', 'null', '']:
+        return None
+    try:
+        return int(float(str(val).replace(',', '.')))
+    except (ValueError, OverflowError):
+        return None
+
+
+@lru_cache(maxsize=1000)
+def _to_bool(val) -> bool:
+    """Конвертация в bool"""
+    if not val:
+        return False
+    return str(val).lower() in BOOLEAN_TRUE
+
+
+def _copy_text(value: str) -> str:
+    """Экранирование значения для COPY ... FROM STDIN (текстовый формат)"""
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _round_price(value: Decimal) -> Decimal:
+    """Округление цены до копеек, как при записи в NUMERIC(10, 2)"""
+    try:
+        return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return value
+
+
+def _decimal_fits(field_name):
+    """Проверка, что разобранное число поместится в DecimalField товара"""
+    field = Product._meta.get_field(field_name)
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    step = Decimal(1).scaleb(-field.decimal_places)
+
+    def check(val):
+        value = _to_decimal(val)
+        if value is None:
+            return True  # неразборчивое значение пропускается, как раньше
+        try:
+            return value.is_finite() and abs(value.quantize(step)) < limit
+        except InvalidOperation:
+            return False
+    return check
+
+
+def _int_fits(field_name):
+    # Стандартный диапазон поля (SQLite сам верхнюю границу не проверяет)
+    internal_type = Product._meta.get_field(field_name).get_internal_type()
+    low, high = BaseDatabaseOperations.integer_field_ranges[internal_type]
+
+    def check(val):
+        value = _to_int(val)
+        return value is None or low <= value <= high
+    return check
+
+
+def _length_fits(field_name):
+    max_length = Product._meta.get_field(field_name).max_length
+    return lambda val: len(val) <= max_length
+
+
+def _supports_update_from():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 33)
+
+
+def bulk_update_rows(objs, fields):
+    """
+    bulk_update одним UPDATE ... FROM (VALUES ...) на пачку (PostgreSQL,
+    SQLite 3.33+): CASE WHEN из bulk_update на 1000 строк выполняется
+    в 15-70 раз дольше. В остальных БД - обычный bulk_update.
+    """
+    if not objs:
+        return
+    model = type(objs[0])
+    if not _supports_update_from():
+        model.objects.bulk_update(objs, fields)
+        return
+    
+    quote = connection.ops.quote_name
+    pk = model._meta.pk
+    columns = [pk] + [model._meta.get_field(name) for name in fields]
+    if connection.vendor == 'postgresql':
+        # Типы значений VALUES PostgreSQL выводит из первой строки - задаются явно
+        row = '({})'.format(', '.join(f'%s::{field.db_type(connection)}' for field in columns))
+    else:
+        row = '({})'.format(', '.join(['%s'] * len(columns)))
+    names = ', '.join(quote(field.column) for field in columns)
+    assignments = ', '.join(f'{quote(field.column)} = v.{quote(field.column)}' for field in columns[1:])
+    table = quote(model._meta.db_table)
+    
+    batch_size = connection.ops.bulk_batch_size(columns, objs)
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            cursor.execute(
+                f'WITH v ({names}) AS (VALUES {", ".join([row] * len(batch))}) '
+                f'UPDATE {table} SET {assignments} FROM v '
+                f'WHERE {table}.{quote(pk.column)} = v.{quote(pk.column)}',
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    for obj in batch for field in columns
+                ]
+            )
+
+
+class ImportTaskLost(Exception):
+    """Импорт забрал другой воркер (отметка устарела) - этот больше ничего не записывает"""
 
 
 class ProductImportService:
-    """Сервис импорта товаров из Excel/CSV"""
+    """
+    Сервис импорта товаров из Excel/CSV.
+
+    Строки обрабатываются пачками по chunk_size: один запрос товаров по SKU
+    на пачку, bulk_create/bulk_update товаров, массовая запись связей с
+    категориями и логов. bulk-операции не вызывают сигналы - поисковый индекс,
+    похожие товары, счетчики категорий и кеш ответов обновляются явно.
     
-    BOOLEAN_TRUE = ['true', '1', 'yes', 'да', 'д', 'y', '+', 'on', 'вкл', 'да']
+    С task.shards > 1 (PostgreSQL) строки делятся между процессами по SKU и
+    slug (products/import_shards.py); shard - номер процесса в таком импорте.
+    """
     
-    def __init__(self, import_task: ProductImport):
+    def __init__(self, import_task: ProductImport, chunk_size: int = None, shard: int = None):
         self.task = import_task
+        self.shard = shard
         self.errors = []
+        self.chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        self._categories = {}  # slug -> Category на время импорта
+        self._category_ids = set()  # категории, чьи счетчики нужно пересчитать
+        self._logs = []
+        self._images = None  # ImageFetcher на время импорта
+        self._new_images = {}  # товар -> новые изображения (если набор изменился)
     
     def process(self):
-        """Основной метод обработки"""
+        """
+        Основной метод обработки. Если импорт прерывался (processed_rows > 0),
+        продолжает со следующей незаписанной пачки.
+        """
+        resumed = self.task.processed_rows > 0
         self.task.status = 'processing'
-        self.task.save()
+        if not resumed:
+            self.task.started_at = timezone.now()
+        self.task.heartbeat_at = timezone.now()
+        self._save_task(['status', 'started_at', 'heartbeat_at'])
         
         try:
-            # Читаем файл
-            df = self._read_file()
-            self.task.total_rows = len(df)
-            self.task.save()
-            
-            # Обрабатываем каждую строку
-            for idx, row in df.iterrows():
-                row_num = int(idx) + 2  # +2: заголовок и 0-based индекс
-                try:
-                    self._process_row(row, row_num)
-                except Exception as e:
-                    self._log(row_num, row, 'error', str(e))
-                    self.task.error_count += 1
+            # Файл читается потоково, строки - пачками по мере обработки
+            import_file = self._read_file()
+            run_started, run_start_row = time.time(), self.task.processed_rows
+            if self._sharded():
+                finished = self._process_shards(import_file, run_started, run_start_row)
+            else:
+                self.task.total_rows = import_file.count()
+                self.task.heartbeat_at = timezone.now()
+                self._save_task(['total_rows', 'heartbeat_at'])
+                finished = self._process_file(import_file, self.task.processed_rows, None, run_started, run_start_row)
             
-            # Определяем финальный статус
-            if self.task.error_count == 0:
-                self.task.status = 'completed'
-            elif self.task.created_count > 0 or self.task.updated_count > 0:
-                self.task.status = 'partial'
+            if not finished:
+                self.task.status = 'cancelled'
             else:
-                self.task.status = 'error'
+                # Размер листа xlsx мог учитывать пустые строки в конце
+                self.task.total_rows = self.task.processed_rows
+                # Определяем финальный статус
+                if self.task.error_count == 0:
+                    self.task.status = 'completed'
+                elif self.task.created_count or self.task.updated_count or self.task.unchanged_count:
+                    self.task.status = 'partial'
+                else:
+                    self.task.status = 'error'
                 
+        except ImportTaskLost:
+            # Итог запишет воркер, который продолжает импорт
+            if self._images is not None:
+                self._images.close()
+            raise
         except Exception as e:
+            # Счетчики незаписанной пачки откатываются вместе с ней
+            self._logs = []
+            self.task.refresh_from_db(fields=PROGRESS_FIELDS)
             self.task.status = 'error'
             self.task.error_message = str(e)
         
-        from django.utils import timezone
+        if self._images is not None:
+            self._images.close()
+        self._flush_logs()
+        if resumed and not self.task.dry_run:
+            # Категории, затронутые до перерыва, неизвестны - пересчет всех счетчиков
+            self._category_ids = set(Category.objects.values_list('pk', flat=True))
+        self._refresh_category_counts()
+        self.task.estimated_finish_at = None
         self.task.processed_at = timezone.now()
-        self.task.save()
+        self._save_task(FINISH_FIELDS)
         
         # Генерируем лог
         self._generate_log_file()
     
-    def _read_file(self) -> pd.DataFrame:
-        """Чтение файла"""
-        path = self.task.file.path
-        ext = os.path.splitext(path)[1].lower()
-        
-        if ext == '.csv':
-            # Пробуем разные кодировки
-            for encoding in ['utf-8', 'utf-8-sig', 'cp1251', 'latin1']:
-                try:
-                    return pd.read_csv(path, encoding=encoding, dtype=str)
-                except:
-                    continue
-            raise ValueError("Не удалось прочитать CSV файл")
-        
-        elif ext in ['.xlsx', '.xls']:
-            return pd.read_excel(path, dtype=str)
+    def process_shard(self, plan: bytes, run_started: float, run_start_row: int) -> bool:
+        """
+        Обработка строк своего процесса (products/import_shards.py). Счетчики
+        задачи копят только текущую пачку и прибавляются к строке импорта
+        в _save_progress. Возвращает False, если импорт отменен.
+        """
+        for field in ROW_COUNTERS:
+            setattr(self.task, field, 0)
+        self.task.diff_summary = {}
+        start = self.task.shard_progress.get(str(self.shard), 0)
+        try:
+            return self._process_file(self._read_file(), start, plan, run_started, run_start_row)
+        finally:
+            if self._images is not None:
+                self._images.close()
+    
+    def _sharded(self) -> bool:
+        """
+        Импорт делится между процессами: только PostgreSQL (SQLite не пишет
+        параллельно) и не пробный запуск - его пачки не видят записей
+        предыдущих, и деление изменило бы результат
+        """
+        if self.task.shard_progress:
+            return True  # продолжение с тем же делением
+        return self.task.shards > 1 and not self.task.dry_run and connection.vendor == 'postgresql'
+    
+    def _process_shards(self, import_file: ImportFile, run_started: float, run_start_row: int) -> bool:
+        """Деление файла между процессами и их запуск; счетчики процессы складывают в строке импорта"""
+        shards = len(self.task.shard_progress) or min(self.task.shards, MAX_IMPORT_SHARDS)
+        plan = plan_import(self, import_file, shards)
+        self.task.total_rows = len(plan)
+        if not self.task.shard_progress:
+            self.task.shard_progress = {str(shard): 0 for shard in range(shards)}
+        self._save_task(['total_rows', 'shard_progress'])
         
+        results = run_shards(self.task, plan, shards, run_started, run_start_row)
+        self.task.refresh_from_db(fields=PROGRESS_FIELDS)
+        for _, category_ids, _ in results:
+            self._category_ids.update(category_ids)
+        errors = [error for _, _, error in results if error]
+        if errors:
+            raise RuntimeError(errors[0])
+        return all(finished for finished, _, _ in results)
+    
+    def _process_file(self, import_file: ImportFile, start: int, plan, run_started: float, run_start_row: int) -> bool:
+        """Пачки строк начиная со start; False - импорт отменен"""
+        for rows in self._iter_chunks(import_file, start, plan):
+            if self._cancel_requested():
+                return False
+            if not self.task.dry_run:
+                # Изображения скачиваются до транзакции - сеть не держит блокировки
+                self._fetch_images(rows)
+            # Пачка, ее логи и прогресс фиксируются вместе
+            with transaction.atomic():
+                if self.task.dry_run:
+                    self._dry_run_chunk(rows)
+                else:
+                    self._process_chunk(rows)
+                self._flush_logs()
+                self._save_progress(len(rows), run_started, run_start_row)
+        return True
+    
+    def _read_file(self) -> ImportFile:
+        """Открытие файла (products/import_reader.py): кодировка CSV и заголовки"""
+        return ImportFile(self.task.file.path)
+    
+    def _cancel_requested(self) -> bool:
+        return ProductImport.objects.filter(pk=self.task.pk, cancel_requested=True).exists()
+    
+    def _save_progress(self, rows_count: int, run_started: float, run_start_row: int):
+        """Прогресс, скорость и ожидаемое время завершения после пачки"""
+        task = self.task if self.shard is None else self._merge_counters(rows_count)
+        now = timezone.now()
+        task.processed_rows += rows_count
+        # time.time(): начало отсчитано в другом процессе
+        elapsed = time.time() - run_started
+        rate = (task.processed_rows - run_start_row) / elapsed if elapsed else 0
+        remaining = task.total_rows - task.processed_rows
+        task.rows_per_second = round(rate, 1)
+        task.estimated_finish_at = now + timedelta(seconds=remaining / rate) if rate else None
+        task.heartbeat_at = now
+        self._save_task(PROGRESS_FIELDS, task)
+    
+    def _save_task(self, fields: list, task: ProductImport = None):
+        """
+        Запись полей задачи, пока ее ведет этот воркер: после STALE_AFTER
+        без отметки задачу забирает другой (products/import_worker.py),
+        тогда ImportTaskLost - пачка откатывается, прогресс не затирается
+        """
+        task = task or self.task
+        values = {field: getattr(task, field) for field in fields}
+        if not ProductImport.objects.filter(pk=task.pk, worker=self.task.worker).update(**values):
+            raise ImportTaskLost(f'Импорт #{task.pk} продолжает другой воркер')
+    
+    def _touch_heartbeat(self):
+        """Отметка воркера на долгих шагах без записи прогресса - не чаще HEARTBEAT_INTERVAL"""
+        now = timezone.now()
+        if self.task.heartbeat_at and (now - self.task.heartbeat_at).total_seconds() < HEARTBEAT_INTERVAL:
+            return
+        self.task.heartbeat_at = now
+        self._save_task(['heartbeat_at'])
+    
+    def _merge_counters(self, rows_count: int) -> ProductImport:
+        """
+        Счетчики пачки процесса прибавляются к строке импорта под блокировкой
+        (в транзакции пачки) - процессы не затирают счетчики друг друга
+        """
+        task = ProductImport.objects.select_for_update().filter(pk=self.task.pk, worker=self.task.worker).first()
+        if task is None:
+            raise ImportTaskLost(f'Импорт #{self.task.pk} продолжает другой воркер')
+        for field in ROW_COUNTERS:
+            setattr(task, field, getattr(task, field) + getattr(self.task, field))
+            setattr(self.task, field, 0)
+        for field, count in self.task.diff_summary.items():
+            task.diff_summary[field] = task.diff_summary.get(field, 0) + count
+        self.task.diff_summary = {}
+        key = str(self.shard)
+        task.shard_progress[key] = task.shard_progress.get(key, 0) + rows_count
+        return task
+    
+    def _iter_chunks(self, import_file: ImportFile, start: int = 0, plan: bytes = None):
+        """
+        Пачки строк [(номер строки, данные)] начиная со start, данные - словарь без пустых значений.
+        С plan - только строки своего процесса (plan[i] - процесс строки i), start считается по ним.
+        """
+        columns = import_file.columns
+        if plan is None:
+            # +2: заголовок и нумерация с 1
+            numbered = enumerate(import_file.rows(start), start + 2)
         else:
-            raise ValueError(f"Неподдерживаемый формат: {ext}")
+            numbered = islice(
+                ((row_num, values) for row_num, values in enumerate(import_file.rows(), 2)
+                 if plan[row_num - 2] == self.shard),
+                start, None
+            )
+        while True:
+            part = list(islice(numbered, self.chunk_size))
+            if not part:
+                return
+            yield [(row_num, self._row_data(columns, values)) for row_num, values in part]
     
-    def _process_row(self, row: pd.Series, row_num: int):
-        """Обработка одной строки"""
-        # Преобразуем в словарь, убираем NaN
+    def _row_data(self, columns: list, values) -> dict:
         data = {}
-        for key, val in row.items():
-            if pd.notna(val):
-                data[str(key).strip().lower()] = str(val).strip()
+        for key, val in zip(columns, values):
+            if val is not None:
+                data[key] = str(val).strip()
+        return data
+    
+    def _dry_run_chunk(self, rows: list):
+        """
+        Пробный запуск пачки: та же запись, что и при импорте (с теми же
+        ошибками), откатывается до сохранения логов и счетчиков.
+        Пачки не видят товаров, созданных предыдущими.
+        """
+        savepoint = transaction.savepoint()
+        try:
+            self._process_chunk(rows)
+        finally:
+            transaction.savepoint_rollback(savepoint)
+            # Созданные в пачке категории откатились вместе с ней
+            self._categories = {}
+            self._category_ids = set()
+    
+    def _process_chunk(self, rows: list):
+        """Обработка пачки строк"""
+        valid = self._validate_chunk(rows)
         
-        # Проверяем обязательные поля
-        name = data.get('name')
-        price = data.get('price')
+        # Повтор SKU делит пачку: следующая часть видит товары, записанные предыдущей,
+        # как при построчной обработке
+        segment, skus = [], set()
+        for row_num, data in valid:
+            sku = data.get('sku')
+            if sku and sku in skus:
+                self._process_rows(segment)
+                segment, skus = [], set()
+            segment.append((row_num, data))
+            if sku:
+                skus.add(sku)
+        if segment:
+            self._process_rows(segment)
+    
+    def _column_checks(self) -> list:
+        """[(колонка, проверка значения)] - значения, которые не примет таблица товаров"""
+        return [
+            ('price', _decimal_fits('price')),
+            ('old_price', _decimal_fits('old_price')),
+            ('stock', _int_fits('stock')),
+            *((column, _length_fits(column)) for column in LENGTH_COLUMNS),
+        ]
+    
+    def _row_errors(self, datas: list) -> list:
+        """
+        Проверка данных строк по колонкам: первая ошибка строки
+        (сообщение, входит ли в счетчик ошибок) или None
+        """
+        errors = [None] * len(datas)
+        # Обязательные поля (такие строки не входят в счетчик ошибок, как и раньше)
+        for column in REQUIRED_COLUMNS:
+            for i, data in enumerate(datas):
+                if errors[i] is None and not data.get(column):
+                    errors[i] = (f'Отсутствует обязательное поле: {column}', False)
+        # Значения, на которых упала бы запись пачки
+        for column, check in self._column_checks():
+            for i, data in enumerate(datas):
+                value = data.get(column)
+                if errors[i] is None and value and not check(value):
+                    errors[i] = (f'Некорректное значение {column}: {value[:100]}', True)
+        return errors
+    
+    def _validate_chunk(self, rows: list) -> list:
+        """
+        Проверка пачки до любой записи: строки с ошибками логируются и дальше не идут
+        """
+        valid = []
+        for (row_num, data), error in zip(rows, self._row_errors([data for _, data in rows])):
+            if error is None:
+                valid.append((row_num, data))
+                continue
+            message, counted = error
+            self._log(row_num, data, 'error', message)
+            if counted:
+                self.task.error_count += 1
+        return valid
+    
+    def _process_rows(self, rows: list):
+        """Строки без повторов SKU: один запрос существующих товаров и запись пачкой"""
+        skus = [data['sku'] for _, data in rows if data.get('sku')]
+        existing = Product.objects.filter(sku__in=skus).in_bulk(field_name='sku') if skus else {}
         
-        if not name:
-            self._log(row_num, data, 'error', 'Отсутствует обязательное поле: name')
-            return
+        creates, updates = [], []
+        for row_num, data in rows:
+            sku = data.get('sku')
+            product = existing.get(sku) if sku else None
+            
+            # Определяем действие
+            if product:
+                if self.task.import_type == 'create':
+                    self._log(row_num, data, 'skipped', f'Товар с SKU {sku} уже существует')
+                    self.task.skipped_count += 1
+                    continue
+                updates.append((row_num, data, product))
+            else:
+                if self.task.import_type == 'update':
+                    self._log(row_num, data, 'skipped', f'Товар с SKU {sku} не найден')
+                    self.task.skipped_count += 1
+                    continue
+                creates.append((row_num, data))
         
-        if not price:
-            self._log(row_num, data, 'error', 'Отсутствует обязательное поле: price')
-            return
+        self._load_categories(data.get('categories') for _, data, *_ in [*creates, *updates])
+        creates, updates, single = self._split_slug_conflicts(creates, updates)
         
-        # Ищем существующий товар по SKU
-        sku = data.get('sku')
-        existing = None
+        try:
+            written = self._write_batch(creates, updates)
+        except Exception:
+            # Пачка не записалась - построчно, ошибка достанется только своей строке
+            single = [(item, None) for item in creates] + [(None, item) for item in updates] + single
+            written = []
+        for create, update in sorted(single, key=lambda item: (item[0] or item[1])[0]):
+            written += self._write_single(create, update)
         
-        if sku:
-            existing = Product.objects.filter(sku=sku).first()
+        self._after_write(written)
+    
+    def _split_slug_conflicts(self, creates: list, updates: list):
+        """
+        Строки, чей slug уже занят другим товаром или более ранней строкой пачки,
+        пишутся отдельно после пачки - ошибка уникальности не роняет всю пачку
+        """
+        slugs = {self._create_slug(data) for _, data in creates}
+        slugs.update(data['slug'] for _, data, _ in updates if data.get('slug'))
+        taken = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'pk')) if slugs else {}
         
-        # Определяем действие
-        if existing:
-            if self.task.import_type == 'create':
-                self._log(row_num, data, 'skipped', f'Товар с SKU {sku} уже существует')
-                self.task.skipped_count += 1
-                return
-            self._update_product(existing, data, row_num)
-        else:
-            if self.task.import_type == 'update':
-                self._log(row_num, data, 'skipped', f'Товар с SKU {sku} не найден')
-                self.task.skipped_count += 1
-                return
-            self._create_product(data, row_num)
+        rows = sorted(
+            [(item[0], item, None) for item in creates] + [(item[0], None, item) for item in updates],
+            key=lambda item: item[0]
+        )
+        batch_creates, batch_updates, single = [], [], []
+        for _, create, update in rows:
+            if create:
+                slug, owner = self._create_slug(create[1]), None
+            else:
+                slug, owner = update[1].get('slug') or update[2].slug, update[2].pk
+            if taken.get(slug, owner) != owner:
+                single.append((create, update))
+                continue
+            taken[slug] = owner if owner else -create[0]
+            if create:
+                batch_creates.append(create)
+            else:
+                batch_updates.append(update)
+        return batch_creates, batch_updates, single
     
-    def _create_product(self, data: dict, row_num: int):
-        """Создание товара"""
+    def _write_single(self, create, update) -> list:
+        """Запись одной строки в своей транзакции"""
+        row_num, data = (create or update)[:2]
         try:
-            with transaction.atomic():
-                product = Product.objects.create(
-                    name=data['name'],
-                    slug=data.get('slug') or slugify(data['name'], allow_unicode=True),
-                    sku=data.get('sku') or self._generate_sku(),
-                    description=data.get('description', ''),
-                    short_description=data.get('short_description', ''),
-                    price=self._to_decimal(data['price']) or Decimal('0'),
-                    old_price=self._to_decimal(data.get('old_price')),
-                    stock=self._to_int(data.get('stock')) or 0,
-                    is_available=self._to_bool(data.get('is_available', 'true')),
-                    is_featured=self._to_bool(data.get('is_featured')),
-                    is_new=self._to_bool(data.get('is_new')),
-                    is_bestseller=self._to_bool(data.get('is_bestseller')),
-                )
-                
-                # Категории
-                if data.get('categories'):
-                    cats = self._parse_categories(data['categories'])
-                    product.categories.set(cats)
-                    if cats:
-                        product.main_category = cats[0]
-                        product.save()
-                elif self.task.default_category:
-                    product.categories.add(self.task.default_category)
-                    product.main_category = self.task.default_category
-                    product.save()
-                
-                # Изображения
-                self._process_images(product, data)
-                
-                self.task.created_count += 1
-                self._log(row_num, data, 'created', f'Товар создан: {product.name} (ID: {product.id})')
-                
+            return self._write_batch([create] if create else [], [update] if update else [])
         except Exception as e:
-            self._log(row_num, data, 'error', f'Ошибка создания: {str(e)}')
+            if create:
+                self._log(row_num, data, 'error', f'Ошибка создания: {str(e)}')
+            else:
+                self._log(row_num, data, 'error', f'Ошибка обновления: {str(e)}')
             self.task.error_count += 1
+            return []
     
-    def _update_product(self, product: Product, data: dict, row_num: int):
-        """Обновление товара"""
-        try:
-            with transaction.atomic():
-                # Обновляем поля
-                if data.get('name'):
-                    product.name = data['name']
-                if data.get('slug'):
-                    product.slug = data['slug']
-                
-                price = self._to_decimal(data.get('price'))
-                if price is not None:
-                    product.price = price
-                
-                old_price = self._to_decimal(data.get('old_price'))
-                if old_price is not None:
-                    product.old_price = old_price
-                
-                stock = self._to_int(data.get('stock'))
-                if stock is not None:
-                    product.stock = stock
-                
-                # Булевы поля
-                if 'is_available' in data:
-                    product.is_available = self._to_bool(data['is_available'])
-                if 'is_featured' in data:
-                    product.is_featured = self._to_bool(data['is_featured'])
-                if 'is_new' in data:
-                    product.is_new = self._to_bool(data['is_new'])
-                if 'is_bestseller' in data:
-                    product.is_bestseller = self._to_bool(data['is_bestseller'])
-                
-                product.save()
-                
-                # Обновляем категории если указаны
-                if data.get('categories'):
-                    cats = self._parse_categories(data['categories'])
-                    product.categories.set(cats)
-                
-                # Обновляем изображения если разрешено
-                if self.task.update_images:
-                    product.images.all().delete()
-                    self._process_images(product, data)
-                
-                self.task.updated_count += 1
-                self._log(row_num, data, 'updated', f'Товар обновлен: {product.name}')
-                
-        except Exception as e:
-            self._log(row_num, data, 'error', f'Ошибка обновления: {str(e)}')
-            self.task.error_count += 1
+    def _write_batch(self, creates: list, updates: list) -> list:
+        """
+        Создание и обновление товаров пачкой в одной транзакции.
+        Возвращает [(номер строки, данные, товар, created)] - без товаров,
+        в которых ничего не изменилось.
+        """
+        with transaction.atomic():
+            created = self._create_products(creates)
+            updated = self._update_products(updates)
+        
+        written = []
+        for row_num, data, product, _ in created:
+            self.task.created_count += 1
+            if self.task.dry_run:
+                self._log(row_num, data, 'created', f'Товар будет создан: {product.name}')
+            else:
+                self._log(row_num, data, 'created', f'Товар создан: {product.name} (ID: {product.id})')
+            written.append((row_num, data, product, True))
+        for row_num, data, product, changes in updated:
+            if not changes:
+                self.task.unchanged_count += 1
+                self._log(row_num, data, 'unchanged', f'Без изменений: {product.name}')
+                continue
+            self.task.updated_count += 1
+            for field in changes:
+                self.task.diff_summary[field] = self.task.diff_summary.get(field, 0) + 1
+            self._log(row_num, data, 'updated', f'Товар обновлен: {product.name} ({", ".join(changes)})')
+            written.append((row_num, data, product, False))
+        return written
     
-    def _parse_categories(self, categories_str: str) -> list:
-        """Парсинг строки категорий"""
-        if not categories_str:
+    def _create_products(self, creates: list) -> list:
+        """Создание товаров одним bulk_create, категории - одной вставкой в связующую таблицу"""
+        if not creates:
             return []
+        products, product_categories, skus = [], [], set()
+        for row_num, data in creates:
+            # Категории
+            if data.get('categories'):
+                cats = self._parse_categories(data['categories'])
+            elif self.task.default_category:
+                cats = [self.task.default_category]
+            else:
+                cats = []
+            
+            sku = data.get('sku')
+            while not sku or sku in skus:
+                sku = self._generate_sku()
+            skus.add(sku)
+            
+            products.append(Product(
+                name=data['name'],
+                slug=self._create_slug(data),
+                sku=sku,
+                description=data.get('description', ''),
+                short_description=data.get('short_description', ''),
+                price=_to_decimal(data['price']) or Decimal('0'),
+                old_price=_to_decimal(data.get('old_price')),
+                stock=_to_int(data.get('stock')) or 0,
+                is_available=_to_bool(data.get('is_available', 'true')),
+                is_featured=_to_bool(data.get('is_featured')),
+                is_new=_to_bool(data.get('is_new')),
+                is_bestseller=_to_bool(data.get('is_bestseller')),
+                main_category=cats[0] if cats else None,
+            ))
+            product_categories.append(cats)
         
-        result = []
-        for cat_name in categories_str.split(','):
-            cat_name = cat_name.strip()
-            if not cat_name:
-                continue
+        Product.objects.bulk_create(products)
+        through = Product.categories.through
+        links = {
+            (product.pk, category.pk)
+            for product, cats in zip(products, product_categories)
+            for category in cats
+        }
+        through.objects.bulk_create(
+            [through(product_id=product_id, category_id=category_id) for product_id, category_id in links]
+        )
+        self._category_ids.update(category_id for _, category_id in links)
+        
+        return [
+            (row_num, data, product, True)
+            for (row_num, data), product in zip(creates, products)
+        ]
+    
+    def _update_products(self, updates: list) -> list:
+        """
+        Сравнение строк с текущими товарами и запись только изменившихся колонок:
+        один bulk-UPDATE на каждый набор изменившихся полей.
+        Возвращает [(номер строки, данные, товар, [изменившиеся поля])].
+        """
+        if not updates:
+            return []
+        through = Product.categories.through
+        product_ids = [product.pk for _, _, product in updates]
+        current = {}  # товар -> {категория: id связи}
+        for link_id, product_id, category_id in through.objects.filter(
+            product_id__in=product_ids
+        ).values_list('id', 'product_id', 'category_id'):
+            current.setdefault(product_id, {})[category_id] = link_id
+        # Изображения сравниваются по путям в хранилище (без пробного запуска - он не скачивает)
+        compare_images = self.task.update_images and not self.task.dry_run
+        current_images = {}
+        if compare_images:
+            for product_id, path, order, is_main in ProductImage.objects.filter(
+                product_id__in=product_ids
+            ).order_by('order', 'pk').values_list('product_id', 'image', 'order', 'is_main'):
+                current_images.setdefault(product_id, []).append((path, order, is_main))
+        
+        now = timezone.now()
+        result, groups, new_categories = [], {}, {}
+        for row_num, data, product in updates:
+            changes = self._apply_row(product, data)
+            
+            # Категории меняются, только если указаны и отличаются
+            if data.get('categories'):
+                category_ids = {cat.pk for cat in self._parse_categories(data['categories'])}
+                if category_ids != set(current.get(product.pk, {})):
+                    new_categories[product.pk] = category_ids
+                    changes.append('categories')
+            
+            if compare_images:
+                images = self._process_images(product, data)
+                if [(image.image.name, image.order, image.is_main) for image in images] != current_images.get(product.pk, []):
+                    self._new_images[product.pk] = images
+                    changes.append('images')
             
-            # Создаем или находим категорию
-            slug = slugify(cat_name, allow_unicode=True)
-            cat, _ = Category.objects.get_or_create(
-                slug=slug,
-                defaults={'name': cat_name, 'is_active': True}
+            if changes:
+                product.updated_at = now
+                columns = tuple(field for field in UPDATE_FIELDS if field in changes) + ('updated_at',)
+                groups.setdefault(columns, []).append(product)
+                # Счетчики зависят от доступности и категорий - пересчитываются старые и новые
+                self._category_ids.update(current.get(product.pk, {}))
+                self._category_ids.update(new_categories.get(product.pk, ()))
+            result.append((row_num, data, product, changes))
+        
+        for columns, products in groups.items():
+            bulk_update_rows(products, list(columns))
+        
+        # Синхронизация связей с категориями: удаляются лишние, добавляются недостающие
+        stale_links, new_links = [], []
+        for product_id, category_ids in new_categories.items():
+            linked = current.get(product_id, {})
+            stale_links.extend(link_id for category_id, link_id in linked.items() if category_id not in category_ids)
+            new_links.extend(
+                through(product_id=product_id, category_id=category_id)
+                for category_id in category_ids if category_id not in linked
             )
-            result.append(cat)
+        if stale_links:
+            through.objects.filter(pk__in=stale_links).delete()
+        through.objects.bulk_create(new_links)
         
         return result
     
-    def _process_images(self, product: Product, data: dict):
-        """Обработка изображений"""
-        images = []
+    def _apply_row(self, product: Product, data: dict) -> list:
+        """Значения строки в товар; возвращает поля, которые изменились"""
+        before = {field: getattr(product, field) for field in UPDATE_FIELDS}
+        
+        if data.get('name'):
+            product.name = data['name']
+        if data.get('slug'):
+            product.slug = data['slug']
+        
+        # Цены округляются как в БД, иначе 10.505 всегда отличалось бы от 10.51
+        price = _to_decimal(data.get('price'))
+        if price is not None:
+            product.price = _round_price(price)
         
-        for i in range(1, 6):
-            url = data.get(f'image_{i}')
-            if url:
-                images.append({
-                    'url': url,
-                    'is_main': i == 1,
-                    'order': i
-                })
+        old_price = _to_decimal(data.get('old_price'))
+        if old_price is not None:
+            product.old_price = _round_price(old_price)
         
-        for img_data in images:
-            try:
-                self._download_image(product, img_data)
-            except Exception as e:
-                print(f"Error image {img_data['url']}: {e}")
-    
-    def _download_image(self, product: Product, img_data: dict):
-        """Скачивание изображения"""
-        url = img_data['url']
+        stock = _to_int(data.get('stock'))
+        if stock is not None:
+            product.stock = stock
         
-        # Пропускаем пустые URL
-        if not url or url.lower() in ['nan', 'none', 'null', '-']:
+        # Булевы поля
+        if 'is_available' in data:
+            product.is_available = _to_bool(data['is_available'])
+        if 'is_featured' in data:
+            product.is_featured = _to_bool(data['is_featured'])
+        if 'is_new' in data:
+            product.is_new = _to_bool(data['is_new'])
+        if 'is_bestseller' in data:
+            product.is_bestseller = _to_bool(data['is_bestseller'])
+        
+        return [field for field, value in before.items() if getattr(product, field) != value]
+    
+    def _after_write(self, written: list):
+        """Изображения и производные данные, которые при save() обновляли сигналы"""
+        new_images, self._new_images = self._new_images, {}
+        if not written or self.task.dry_run:
             return
+        # Изображения (сигналы post_save не нужны - кеш товаров сбрасывается ниже):
+        # у новых товаров - из строки, у обновленных - только если набор изменился
+        images = []
+        replaced = []
+        for row_num, data, product, created in written:
+            if created:
+                images += self._process_images(product, data)
+            elif product.pk in new_images:
+                images += new_images[product.pk]
+                replaced.append(product.pk)
+        if replaced:
+            ProductImage.objects.filter(product_id__in=replaced).delete()
+        ProductImage.objects.bulk_create(images)
         
-        # Если локальный путь
-        if url.startswith('/media/'):
-            path = url.replace('/media/', '')
-            if default_storage.exists(path):
-                ProductImage.objects.create(
-                    product=product,
-                    image=path,
-                    is_main=img_data['is_main'],
-                    order=img_data['order']
+        product_ids = [product.pk for _, _, product, _ in written]
+        update_search_vectors(product_ids)
+        mark_related_stale(product_ids)
+        invalidate_cache_tags('products', *(f'product:{pk}' for pk in product_ids))
+    
+    def _refresh_category_counts(self):
+        if not self._category_ids:
+            return
+        Category.refresh_product_counts(self._category_ids)
+        bump_category_tree_version()
+        invalidate_cache_tags('categories')
+        self._category_ids = set()
+    
+    def _create_slug(self, data: dict) -> str:
+        return data.get('slug') or _slugify(data['name'])
+    
+    def _category_names(self, categories_str: str) -> list:
+        return [name.strip() for name in categories_str.split(',') if name.strip()]
+    
+    def _load_categories(self, categories_strs):
+        """Все категории пачки одним запросом; отсутствующие создаются"""
+        names = {}
+        for categories_str in categories_strs:
+            for cat_name in self._category_names(categories_str or ''):
+                slug = _slugify(cat_name)
+                if slug not in self._categories:
+                    names.setdefault(slug, cat_name)
+        if not names:
+            return
+        # Сначала по названию: у категорий из админки slug задан вручную (транслитом)
+        slugs = {cat_name: slug for slug, cat_name in names.items()}
+        for category in Category.objects.filter(name__in=list(slugs)):
+            self._categories[slugs[category.name]] = category
+        missing = [slug for slug in names if slug not in self._categories]
+        self._categories.update(Category.objects.in_bulk(missing, field_name='slug'))
+        for slug, cat_name in names.items():
+            if slug not in self._categories:
+                # Создаем или находим категорию (save() строит путь в дереве)
+                self._categories[slug], _ = Category.objects.get_or_create(
+                    name=cat_name,
+                    defaults={'slug': slug, 'is_active': True}
                 )
+    
+    def _parse_categories(self, categories_str: str) -> list:
+        """Парсинг строки категорий (категории берутся из кеша импорта)"""
+        if not categories_str:
+            return []
+        slugs = [_slugify(cat_name) for cat_name in self._category_names(categories_str)]
+        if any(slug not in self._categories for slug in slugs):
+            self._load_categories([categories_str])
+        return [self._categories[slug] for slug in slugs]
+    
+    def _image_urls(self, data: dict) -> list:
+        """[(порядок, url)] непустых изображений строки"""
+        urls = []
+        for order, column in enumerate(IMAGE_COLUMNS, 1):
+            url = data.get(column)
+            # Пропускаем пустые URL
+            if url and url.lower() not in ['nan', 'none', 'null', '-']:
+                urls.append((order, url))
+        return urls
+    
+    def _image_filename(self, name: str, order: int, url: str) -> str:
+        ext = url.split('.')[-1].split('?')[0][:4]
+        if ext not in ['jpg', 'jpeg', 'png', 'webp', 'gif']:
+            ext = 'jpg'
+        return f"{slugify(name)[:30]}_{order}.{ext}"
+    
+    def _fetch_images(self, rows: list):
+        """
+        Скачивание изображений пачки параллельно (products/image_fetcher.py).
+        Без update_images изображения нужны только новым товарам.
+        """
+        if not any(column in data for _, data in rows for column in IMAGE_COLUMNS):
             return
+        existing = set()
+        if not self.task.update_images and self.task.import_type != 'create':
+            skus = [data['sku'] for _, data in rows if data.get('sku')]
+            existing = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
         
-        # Скачиваем по URL
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            ext = url.split('.')[-1].split('?')[0][:4]
-            if ext not in ['jpg', 'jpeg', 'png', 'webp', 'gif']:
-                ext = 'jpg'
-            
-            filename = f"{slugify(product.name)[:30]}_{img_data['order']}.{ext}"
-            
-            ProductImage.objects.create(
-                product=product,
-                image=ContentFile(response.content, name=filename),
-                is_main=img_data['is_main'],
-                order=img_data['order']
-            )
-        except Exception as e:
-            raise Exception(f"Download failed: {e}")
-    
-    def _to_decimal(self, val) -> Decimal | None:
-        """Конвертация в Decimal"""
-        if not val or str(val).lower() in ['nan', 'none', 'null', '']:
-            return None
-        try:
-            cleaned = str(val).replace(',', '.').replace(' ', '').replace('₽', '').replace('$', '')
-            return Decimal(cleaned)
-        except:
-            return None
-    
-    def _to_int(self, val) -> int | None:
-        """Конвертация в int"""
-        if not val or str(val).lower() in ['nan', 'none', 'null', '']:
-            return None
-        try:
-            return int(float(str(val).replace(',', '.')))
-        except:
-            return None
+        files = {}
+        for row_num, data in rows:
+            if data.get('sku') in existing:
+                continue
+            for order, url in self._image_urls(data):
+                if not url.startswith('/media/'):
+                    files.setdefault(url, self._image_filename(data.get('name', ''), order, url))
+        if files:
+            if self._images is None:
+                self._images = ImageFetcher()
+            # Отметка воркера между скачиваниями: пачка может качаться дольше STALE_AFTER
+            self._images.fetch_many(files, progress=self._touch_heartbeat)
     
-    def _to_bool(self, val) -> bool:
-        """Конвертация в bool"""
-        if not val:
-            return False
-        return str(val).lower() in self.BOOLEAN_TRUE
+    def _process_images(self, product: Product, data: dict) -> list:
+        """Изображения товара [ProductImage] из скачанных файлов"""
+        images = []
+        for order, url in self._image_urls(data):
+            # Если локальный путь
+            if url.startswith('/media/'):
+                path = url.replace('/media/', '')
+                if not default_storage.exists(path):
+                    continue
+            else:
+                path = self._images.get(url) if self._images else None
+                if path is None:
+                    # URL не попал в предварительное скачивание
+                    if self._images is None:
+                        self._images = ImageFetcher()
+                    path = self._images.fetch_many({url: self._image_filename(product.name, order, url)})[url]
+                if isinstance(path, Exception):
+                    logger.warning('Импорт #%s: изображение %s не загружено: %s', self.task.pk, url, path)
+                    continue
+            images.append(ProductImage(product=product, image=path, is_main=order == 1, order=order))
+        return images
     
     def _generate_sku(self) -> str:
         """Генерация SKU"""
@@ -326,40 +911,62 @@ class ProductImportService:
         return f"SKU-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(1000, 9999)}"
     
     def _log(self, row_num: int, data: dict, status: str, message: str):
-        """Создание лога"""
-        ProductImportLog.objects.create(
-            import_task=self.task,
-            row_number=row_num,
-            sku=str(data.get('sku', '')),
-            product_name=str(data.get('name', '')),
-            status=status,
-            message=message,
-            raw_data=data
-        )
+        """Лог строки (записывается пачкой в _flush_logs)"""
+        self._logs.append((
+            row_num,
+            str(data.get('sku', ''))[:50],
+            str(data.get('name', ''))[:200],
+            status,
+            message,
+            data,
+        ))
+    
+    def _flush_logs(self):
+        """Запись накопленных логов: COPY в PostgreSQL, bulk_create в остальных БД"""
+        if not self._logs:
+            return
+        logs, self._logs = self._logs, []
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            buffer.writelines(
+                '\t'.join([str(self.task.pk), str(row_num), *map(_copy_text, fields), _copy_text(json.dumps(data))]) + '\n'
+                for row_num, *fields, data in logs
+            )
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {ProductImportLog._meta.db_table} '
+                    '(import_task_id, row_number, sku, product_name, status, message, raw_data) FROM STDIN',
+                    buffer
+                )
+            return
+        ProductImportLog.objects.bulk_create([
+            ProductImportLog(
+                import_task=self.task, row_number=row_num, sku=sku, product_name=name,
+                status=status, message=message, raw_data=data
+            )
+            for row_num, sku, name, status, message, data in logs
+        ])
     
     def _generate_log_file(self):
-        """Генерация CSV лога"""
-        import csv
-        
-        logs = self.task.logs.all()
-        if not logs:
+        """
+        Генерация CSV лога: строки читаются из БД порциями и пишутся во
+        временный файл, который затем передается в хранилище
+        """
+        logs = self.task.logs.order_by('row_number', 'pk').values_list(
+            'row_number', 'sku', 'product_name', 'status', 'message'
+        )
+        if not logs.exists():
             return
         
-        output = []
-        writer = csv.writer(output)
-        writer.writerow(['Row', 'SKU', 'Name', 'Status', 'Message'])
-        
-        for log in logs:
-            writer.writerow([
-                log.row_number,
-                log.sku,
-                log.product_name,
-                log.status,
-                log.message
-            ])
-        
-        filename = f'import_{self.task.id}_log.csv'
-        self.task.log_file.save(
-            filename,
-            ContentFile('\n'.join(output).encode('utf-8-sig'))
-        )
\ No newline at end of file
+        with tempfile.TemporaryFile() as output:
+            text = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+            writer = csv.writer(text)
+            writer.writerow(['Row', 'SKU', 'Name', 'Status', 'Message'])
+            writer.writerows(logs.iterator(chunk_size=LOG_FILE_CHUNK_SIZE))
+            text.detach()
+            output.seek(0)
+            
+            filename = f'import_{self.task.id}_log.csv'
+            self.task.log_file.save(filename, File(output), save=False)
+            self.task.save(update_fields=['log_file'])
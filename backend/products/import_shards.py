@@ -0,0 +1,122 @@
+import multiprocessing
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import django
+import numpy as np
+from .models import Product
+
+
+# Больше процессов не имеет смысла: упирается в БД (и номер процесса хранится в uint8)
+MAX_IMPORT_SHARDS = 64
+
+
+def _key(value) -> int:
+    """Устойчивый между запусками ключ строки (hash() зависит от процесса): 0 - ключа нет"""
+    if not value:
+        return 0
+    return zlib.crc32(value.encode('utf-8')) or 1
+
+
+def assign_shards(sku_keys, slug_keys, shards: int):
+    """
+    Номер процесса каждой строки. Строки, связанные общим ключом (SKU или slug),
+    в том числе через цепочку других строк, получают один номер: метка
+    компоненты - наименьший индекс строки в ней (распространение минимума по
+    группам ключей + сжатие путей, без циклов по строкам).
+    """
+    labels = np.arange(len(sku_keys))
+    groups = []
+    for keys in (sku_keys, slug_keys):
+        rows = np.flatnonzero(keys)
+        unique, inverse = np.unique(keys[rows], return_inverse=True)
+        groups.append((rows, inverse, len(unique)))
+
+    while True:
+        previous = labels.copy()
+        for rows, inverse, size in groups:
+            lowest = np.full(size, len(labels))
+            np.minimum.at(lowest, inverse, labels[rows])
+            labels[rows] = lowest[inverse]
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return (labels % shards).astype(np.uint8)
+
+
+def _imported_categories(service, datas: list, seen: set):
+    """Строки категорий из строк пачки, которые дойдут до записи товара"""
+    errors = service._row_errors(datas)
+    valid = [data for data, error in zip(datas, errors) if error is None]
+    import_type = service.task.import_type
+    existing = set()
+    if import_type != 'create_update':
+        skus = [data['sku'] for data in valid if data.get('sku')]
+        existing = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+
+    for data in valid:
+        sku = data.get('sku')
+        if import_type == 'update':
+            if sku in existing:
+                yield data.get('categories')
+        elif import_type == 'create':
+            # Повтор SKU в файле пропускается, как и существующий товар
+            if not sku or (sku not in existing and sku not in seen):
+                yield data.get('categories')
+            seen.add(sku)
+        else:
+            yield data.get('categories')
+
+
+def plan_import(service, import_file, shards: int) -> bytes:
+    """
+    План деления файла: plan[i] - процесс строки i. Строки с общим SKU или
+    slug обрабатывает один процесс в порядке файла - результат как при
+    обработке одним процессом. Категории, которые создаст импорт, создаются
+    заранее в порядке файла - процессы не создают одну категорию дважды.
+    Проход по файлу долгий - отметка воркера обновляется по пачкам.
+    """
+    sku_keys, slug_keys = array('L'), array('L')
+    categories, seen = {}, set()
+    for rows in service._iter_chunks(import_file):
+        datas = [data for _, data in rows]
+        for data in datas:
+            sku_keys.append(_key(data.get('sku')))
+            slug_keys.append(_key(service._create_slug(data)) if data.get('name') else 0)
+        categories.update(dict.fromkeys(_imported_categories(service, datas, seen)))
+        service._touch_heartbeat()
+    service._load_categories(categories)
+
+    labels = assign_shards(np.array(sku_keys, dtype=np.int64), np.array(slug_keys, dtype=np.int64), shards)
+    return labels.tobytes()
+
+
+def run_shards(task, plan: bytes, shards: int, run_started: float, run_start_row: int) -> list:
+    """
+    Обработка процессов плана в пуле (spawn: у каждого процесса свое
+    соединение с БД). Возвращает [(закончен ли, категории, ошибка)].
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(shards, mp_context=context, initializer=django.setup) as pool:
+        futures = [
+            pool.submit(_run_shard, task.pk, shard, plan, run_started, run_start_row)
+            for shard in range(shards)
+        ]
+        return [future.result() for future in futures]
+
+
+def _run_shard(task_id: int, shard: int, plan: bytes, run_started: float, run_start_row: int):
+    """Процесс пула: свои строки плана пачками со своими транзакциями"""
+    from .import_models import ProductImport
+    from .import_service import ProductImportService
+
+    service = ProductImportService(ProductImport.objects.get(pk=task_id), shard=shard)
+    try:
+        finished = service.process_shard(plan, run_started, run_start_row)
+    except Exception as e:
+        # Записанные пачки остаются, счетчики упавшей откатились вместе с ней
+        return False, service._category_ids, str(e)
+    return finished, service._category_ids, ''
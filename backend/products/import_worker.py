@@ -0,0 +1,121 @@
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .import_models import ProductImport, ProductImportLog
+from .import_service import ImportTaskLost, ProductImportService
+from .related import refresh_stale_related
+
+
+logger = logging.getLogger(__name__)
+
+# Импорт без отметки воркера дольше этого времени считается прерванным (сбой воркера)
+STALE_AFTER = getattr(settings, 'PRODUCT_IMPORT_STALE_AFTER', 60 * 30)
+# Пауза между проверками очереди, если она пуста
+POLL_INTERVAL = 5
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue_import(task):
+    """
+    Поставить импорт в очередь. Прерванный или отмененный импорт
+    продолжится с processed_rows.
+    """
+    return ProductImport.objects.filter(
+        pk=task.pk, status__in=['pending', 'error', 'cancelled']
+    ).update(status='pending', cancel_requested=False, error_message='')
+
+
+def cancel_import(task):
+    """Ожидающий импорт отменяется сразу, выполняемый - воркером после текущей пачки"""
+    return (
+        ProductImport.objects.filter(pk=task.pk, status='pending').update(status='cancelled') or
+        ProductImport.objects.filter(pk=task.pk, status='processing').update(cancel_requested=True)
+    )
+
+
+def apply_dry_run(task):
+    """
+    Поставить в очередь настоящий импорт после пробного запуска:
+    счетчики, прогресс и логи пробного сбрасываются
+    """
+    with transaction.atomic():
+        count = ProductImport.objects.filter(pk=task.pk, dry_run=True).exclude(status='processing').update(
+            dry_run=False, status='pending', cancel_requested=False, error_message='',
+            total_rows=0, processed_rows=0, created_count=0, updated_count=0, error_count=0,
+            skipped_count=0, unchanged_count=0, diff_summary={}, shard_progress={}, rows_per_second=0,
+            started_at=None, processed_at=None, log_file='',
+        )
+        if count:
+            ProductImportLog.objects.filter(import_task_id=task.pk).delete()
+    return count
+
+
+def claim_next_import(worker):
+    """
+    Взять из очереди следующий импорт: ожидающий или брошенный упавшим воркером.
+    SELECT ... FOR UPDATE SKIP LOCKED - воркеры не ждут друг друга и не берут одну задачу.
+    """
+    stale = timezone.now() - timedelta(seconds=STALE_AFTER)
+    with transaction.atomic():
+        task = ProductImport.objects.select_for_update(skip_locked=True).filter(
+            Q(status='pending') | Q(status='processing', heartbeat_at__lt=stale)
+        ).order_by('created_at').first()
+        if task is None:
+            return None
+        task.status = 'processing'
+        task.worker = worker
+        task.heartbeat_at = timezone.now()
+        task.save(update_fields=['status', 'worker', 'heartbeat_at'])
+    return task
+
+
+def run_worker(once=False, poll_interval=POLL_INTERVAL, log=logger.info):
+    """
+    Цикл воркера: импорты из очереди по одному, в простое - пересчет
+    устаревших похожих товаров. С once - до опустошения очереди импортов
+    """
+    worker = worker_name()
+    while True:
+        task = claim_next_import(worker)
+        if task is None:
+            if once:
+                return
+            # В простое - устаревшие списки похожих товаров (страницы их только читают)
+            if not refresh_stale_related():
+                time.sleep(poll_interval)
+            continue
+
+        if task.processed_rows:
+            log(f'Импорт #{task.pk} "{task.name}": продолжение со строки {task.processed_rows + 1}')
+        else:
+            log(f'Импорт #{task.pk} "{task.name}": начало')
+        if task.shards > 1:
+            log(f'Импорт #{task.pk}: процессов {task.shards}')
+        try:
+            ProductImportService(task).process()
+        except ImportTaskLost as e:
+            # Отметка устарела, импорт продолжает другой воркер
+            log(f'Импорт #{task.pk}: {e}')
+            continue
+        except Exception as e:
+            # Ошибка вне обработки строк (например, при записи файла лога)
+            ProductImport.objects.filter(pk=task.pk, status='processing').update(
+                status='error', error_message=str(e)
+            )
+            log(f'Импорт #{task.pk}: ошибка {e}')
+        task.refresh_from_db()
+        log(
+            f'Импорт #{task.pk}: {task.get_status_display()}, '
+            f'создано {task.created_count}, обновлено {task.updated_count}, '
+            f'без изменений {task.unchanged_count}, пропущено {task.skipped_count}, '
+            f'ошибок {task.error_count}'
+        )
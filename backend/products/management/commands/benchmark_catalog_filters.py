@@ -0,0 +1,135 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from products.models import Category, Product
+
+
+BENCH_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение фильтров каталога: JOIN + DISTINCT (старый вариант) '
+        'и EXISTS-подзапросы (текущий). Выводит число запросов, время и EXPLAIN'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Создать N тестовых товаров (например 200000)')
+        parser.add_argument('--categories', type=int, default=50,
+                            help='Сколько тестовых категорий создать при --seed')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Удалить тестовые товары и категории и выйти')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз выполнять каждый запрос для замера')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE вместо EXPLAIN (только PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            Product.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+            Category.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS('Тестовые данные удалены'))
+            return
+
+        if options['seed']:
+            self._seed(options['seed'], options['categories'])
+
+        category = Category.objects.filter(parent=None, is_active=True).order_by('-product_count').first()
+        product = Product.objects.filter(categories__isnull=False).order_by('?').first()
+        if not category or not product:
+            self.stderr.write('Нет данных для замера, запустите с --seed 200000')
+            return
+
+        all_categories = category.get_all_children(include_self=True)
+        available = Product.objects.filter(is_available=True)
+        cases = [
+            (
+                f'?category={category.slug}',
+                available.filter(categories__slug=category.slug).distinct(),
+                available.in_categories(Category.objects.filter(slug=category.slug)),
+            ),
+            (
+                f'categories/{category.slug}/products/',
+                available.filter(categories__in=all_categories).distinct(),
+                available.in_categories(all_categories),
+            ),
+            (
+                f'{product.slug}/related/',
+                available.filter(categories__in=product.categories.all()).exclude(id=product.id).distinct(),
+                available.in_categories(product.categories.all()).exclude(id=product.id),
+            ),
+        ]
+
+        for name, old_qs, new_qs in cases:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, queryset in (('JOIN + DISTINCT', old_qs), ('EXISTS', new_qs)):
+                page = queryset.order_by('-created_at')[:20]
+                elapsed, queries = self._measure(lambda: list(page.all()), options['repeat'])
+                # COUNT(*) - то, что делает PageNumberPagination на каждой странице
+                count_elapsed, _ = self._measure(queryset.count, options['repeat'])
+                self.stdout.write(
+                    f'  {label:<16} страница: {elapsed * 1000:8.2f} ms, '
+                    f'count: {count_elapsed * 1000:8.2f} ms, '
+                    f'запросов: {queries}, строк: {queryset.count()}'
+                )
+                self.stdout.write(self._explain(page, options['analyze']))
+
+    def _measure(self, func, repeat):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            elapsed = (time.perf_counter() - started) / repeat
+        return elapsed, len(context.captured_queries) // repeat
+
+    def _explain(self, queryset, analyze):
+        if connection.vendor == 'postgresql' and analyze:
+            plan = queryset.explain(analyze=True)
+        else:
+            plan = queryset.explain()
+        return '\n'.join(f'      {line}' for line in plan.splitlines())
+
+    def _seed(self, count, categories_count):
+        self.stdout.write(f'Создание {categories_count} категорий и {count} товаров...')
+        roots = [
+            Category.objects.create(name=f'{BENCH_PREFIX}root-{i}', slug=f'{BENCH_PREFIX}root-{i}')
+            for i in range(max(categories_count // 5, 1))
+        ]
+        categories = list(roots)
+        for i in range(categories_count - len(roots)):
+            categories.append(Category.objects.create(
+                name=f'{BENCH_PREFIX}cat-{i}',
+                slug=f'{BENCH_PREFIX}cat-{i}',
+                parent=random.choice(roots),
+            ))
+
+        through = Product.categories.through
+        batch_size = 5000
+        offset = Product.objects.filter(slug__startswith=BENCH_PREFIX).count()
+        for start in range(0, count, batch_size):
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'Bench product {offset + i}',
+                    slug=f'{BENCH_PREFIX}{offset + i}',
+                    sku=f'BENCH-{offset + i:08d}',
+                    description='',
+                    price=random.randint(100, 100000) / 100,
+                    stock=random.randint(0, 50),
+                    is_available=random.random() > 0.1,
+                )
+                for i in range(start, min(start + batch_size, count))
+            ], batch_size=batch_size)
+            links = []
+            for product in products:
+                for cat in random.sample(categories, k=random.randint(1, 3)):
+                    links.append(through(product_id=product.pk, category_id=cat.pk))
+            through.objects.bulk_create(links, batch_size=batch_size)
+            self.stdout.write(f'  {min(start + batch_size, count)}/{count}')
+
+        Category.rebuild_product_counts()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE products_product, products_product_categories')
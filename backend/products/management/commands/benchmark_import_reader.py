@@ -0,0 +1,101 @@
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from products.import_models import ProductImport
+from products.import_reader import ImportFile
+from products.import_service import ProductImportService
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер чтения файла импорта (products/import_reader.py): подсчет строк '
+        'и разбор пачками, как при импорте, без записи в БД. Выводит время и пиковый RSS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Файл CSV/XLSX/XLS; без него генерируется CSV')
+        parser.add_argument('--size', type=int, default=500,
+                            help='Размер генерируемого CSV в МБ')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Размер пачки (по умолчанию - как у импорта)')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять сгенерированный файл')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        generated = path is None
+        if generated:
+            path = self._generate(options['size'])
+        try:
+            self._benchmark(path, options['chunk_size'])
+        finally:
+            if generated and not options['keep']:
+                os.remove(path)
+            elif generated:
+                self.stdout.write(f'Файл сохранен: {path}')
+
+    def _benchmark(self, path, chunk_size):
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{path} ({size_mb:.0f} МБ)'))
+        rss_before = self._peak_rss_mb()
+
+        started = time.perf_counter()
+        import_file = ImportFile(path)
+        total = import_file.count()
+        count_elapsed = time.perf_counter() - started
+
+        # Чтение и разбор строк тем же кодом, что у импорта (без транзакций и БД)
+        service = ProductImportService(ProductImport(), chunk_size=chunk_size)
+        started = time.perf_counter()
+        rows = chunks = 0
+        for chunk in service._iter_chunks(import_file):
+            rows += len(chunk)
+            chunks += 1
+        read_elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'  строк: {rows} (подсчет: {total}), пачек: {chunks}\n'
+            f'  подсчет строк:  {count_elapsed:7.1f} s\n'
+            f'  чтение пачками: {read_elapsed:7.1f} s ({rows / read_elapsed if read_elapsed else 0:.0f} строк/с)\n'
+            f'  всего:          {count_elapsed + read_elapsed:7.1f} s\n'
+            f'  пиковый RSS: {self._peak_rss_mb():.0f} МБ (до чтения: {rss_before:.0f} МБ)'
+        )
+
+    def _peak_rss_mb(self):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux - килобайты, macOS - байты
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+    def _generate(self, size_mb):
+        """CSV в формате импорта размером около size_mb (строки пишутся по одной)"""
+        limit = size_mb * 1024 * 1024
+        rnd = random.Random(0)
+        words = ['Смартфон', 'Чехол', 'Кабель', 'Наушники', 'Зарядка', 'Стекло', 'Колонка', 'Часы']
+        categories = ['Телефоны', 'Аксессуары', 'Аудио', 'Распродажа', 'Новинки']
+        self.stdout.write(f'Генерация CSV ~{size_mb} МБ...')
+        handle, path = tempfile.mkstemp(suffix='.csv', prefix='import_bench_')
+        with os.fdopen(handle, 'w', encoding='utf-8', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow([
+                'sku', 'name', 'price', 'old_price', 'stock', 'is_available', 'categories',
+                'short_description', 'description', 'image_1',
+            ])
+            index = 0
+            while output.tell() < limit:
+                for _ in range(10000):
+                    name = f'{rnd.choice(words)} {index}'
+                    writer.writerow([
+                        f'BENCH-{index:08d}', name, f'{rnd.randint(100, 100000) / 100:.2f}',
+                        '' if rnd.random() < 0.7 else f'{rnd.randint(100, 100000) / 100:.2f}',
+                        rnd.randint(0, 500), rnd.choice(['да', 'нет', '1', '']),
+                        ', '.join(rnd.sample(categories, rnd.randint(1, 3))),
+                        f'Кратко о товаре {name}', f'Описание товара {name}. ' * rnd.randint(1, 6),
+                        f'https://img.example.com/{index}.jpg',
+                    ])
+                    index += 1
+        return path
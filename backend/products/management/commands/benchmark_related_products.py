@@ -0,0 +1,61 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from products.models import Product
+from products.related import get_related_products, refresh_related_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение похожих товаров: запрос по общим категориям на каждый просмотр '
+        '(старый вариант) и чтение предрасчитанной таблицы (текущий)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=50,
+                            help='Сколько случайных товаров замерять')
+        parser.add_argument('--limit', type=int, default=8,
+                            help='Сколько похожих товаров выбирать')
+
+    def handle(self, *args, **options):
+        products = list(
+            Product.objects.filter(is_available=True, categories__isnull=False)
+            .distinct().order_by('?')[:options['sample']]
+        )
+        if not products:
+            self.stderr.write('Нет товаров с категориями для замера')
+            return
+        limit = options['limit']
+
+        def old(product):
+            return list(Product.objects.filter(
+                is_available=True
+            ).in_categories(product.categories.all()).exclude(id=product.id).for_list()[:limit])
+
+        def new(product):
+            return list(get_related_products(product, limit=limit))
+
+        # Чтение не пересчитывает списки (без строк в таблице - запрос по категориям),
+        # поэтому устаревшие списки выборки пересчитываются до замера
+        stale = [product.pk for product in products if product.related_updated_at is None]
+        if stale:
+            refresh_related_products(stale)
+            self.stdout.write(f'  пересчитано списков: {len(stale)}')
+        # Прогрев кеша БД
+        for product in products:
+            new(product)
+
+        for label, func in (('по категориям', old), ('предрасчет', new)):
+            timings = []
+            with CaptureQueriesContext(connection) as context:
+                for product in products:
+                    started = time.perf_counter()
+                    func(product)
+                    timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(
+                f'  {label:<14} среднее: {sum(timings) / len(timings) * 1000:7.2f} ms, '
+                f'p95: {timings[int(len(timings) * 0.95) - 1] * 1000:7.2f} ms, '
+                f'запросов на товар: {len(context.captured_queries) / len(products):.1f}'
+            )
@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from products.copurchase import (
+    COPURCHASE_CHUNK_SIZE, COPURCHASE_MAX_BASKET, COPURCHASE_TOP_K, build_copurchase_matrix
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет таблицы "покупают вместе" по истории заказов '
+        '(матрица совместных покупок, top-K соседей на товар)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=COPURCHASE_CHUNK_SIZE,
+                            help='Сколько заказов читать за один запрос')
+        parser.add_argument('--top-k', type=int, default=COPURCHASE_TOP_K,
+                            help='Сколько соседей хранить на товар')
+        parser.add_argument('--max-basket', type=int, default=COPURCHASE_MAX_BASKET,
+                            help='Пропускать заказы с большим числом разных товаров')
+        parser.add_argument('--min-count', type=int, default=1,
+                            help='Минимум совместных заказов для пары')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(stats):
+            self.stdout.write(f"  заказов: {stats['orders']}, строк: {stats['lines']}")
+
+        stats = build_copurchase_matrix(
+            chunk_size=options['chunk_size'],
+            top_k=options['top_k'],
+            max_basket=options['max_basket'],
+            min_count=options['min_count'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Заказов: {stats['orders']}, строк: {stats['lines']}, "
+            f"различных пар: {stats['pairs']}, сохранено связей: {stats['links']}, "
+            f"за {time.perf_counter() - started:.1f} с"
+        ))
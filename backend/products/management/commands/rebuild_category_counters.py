@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчет счетчиков товаров (direct_product_count, product_count) для всех категорий'
+
+    def handle(self, *args, **options):
+        Category.rebuild_product_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны для {Category.objects.count()} категорий'
+        ))
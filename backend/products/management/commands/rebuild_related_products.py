@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.related import refresh_related_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет таблицы похожих товаров. Без параметров - полный пересчет, '
+        'с --stale - только устаревшие списки (для периодического запуска)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', action='store_true',
+                            help='Пересчитать только товары с устаревшим списком')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько товаров пересчитывать за одну транзакцию')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.order_by('pk')
+        if options['stale']:
+            queryset = queryset.filter(related_updated_at=None)
+        product_ids = list(queryset.values_list('pk', flat=True))
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        links = 0
+        for start in range(0, len(product_ids), batch_size):
+            links += refresh_related_products(product_ids[start:start + batch_size])
+            self.stdout.write(f'  {min(start + batch_size, len(product_ids))}/{len(product_ids)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано товаров: {len(product_ids)}, связей: {links}, '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from products.import_worker import POLL_INTERVAL, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Воркер импорта товаров: импорты из очереди в фоне, в простое - пересчет похожих товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь и выйти')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                            help='Пауза между проверками пустой очереди, секунд')
+
+    def handle(self, *args, **options):
+        run_worker(
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+            log=lambda message: self.stdout.write(message),
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+PATH_STEP = 10
+
+
+def fill_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.all())
+    children_map = {}
+    for category in categories:
+        children_map.setdefault(category.parent_id, []).append(category)
+
+    # Обход в ширину от корней: путь родителя всегда готов раньше детей
+    queue = [(category, '') for category in children_map.get(None, [])]
+    updated = []
+    while queue:
+        category, parent_path = queue.pop(0)
+        category.path = f'{parent_path}{category.pk:0{PATH_STEP}d}/'
+        category.depth = category.path.count('/') - 1
+        updated.append(category)
+        queue.extend((child, category.path) for child in children_map.get(category.pk, []))
+
+    Category.objects.bulk_update(updated, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productimport_productimportlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:40
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_product_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    direct_counts = dict(
+        Category.objects.annotate(
+            available=Count('products', filter=Q(products__is_available=True))
+        ).values_list('pk', 'available')
+    )
+    for category in Category.objects.only('pk', 'path'):
+        total = Product.objects.filter(
+            is_available=True,
+            categories__is_active=True,
+            categories__path__startswith=category.path,
+        ).values('pk').distinct().count()
+        Category.objects.filter(pk=category.pk).update(
+            direct_product_count=direct_counts.get(category.pk, 0),
+            product_count=total,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='direct_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Доступных товаров непосредственно в категории'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Доступных товаров в категории и активных подкатегориях'),
+        ),
+        migrations.RunPython(fill_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:43
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # GIN-индекс и tsvector есть только в PostgreSQL; в SQLite поиск идет через icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS products_product_search_vector_gin '
+        'ON products_product USING gin (search_vector)'
+    )
+    Product = apps.get_model('products', 'Product')
+    vector = SearchVector('sku', weight='B', config='simple')
+    for config in ('russian', 'english'):
+        vector = (
+            vector
+            + SearchVector('name', weight='A', config=config)
+            + SearchVector('short_description', weight='C', config=config)
+            + SearchVector('description', weight='D', config=config)
+        )
+    Product.objects.update(search_vector=vector)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS products_product_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_category_product_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, transaction
+
+
+TRIGRAM_INDEXES = [
+    ('products_product_name_trgm', 'products_product', 'name'),
+    ('products_product_sku_trgm', 'products_product', 'sku'),
+    ('products_category_name_trgm', 'products_category', 'name'),
+]
+
+
+def create_autocomplete_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    trigram = False
+    if connection.vendor == 'postgresql':
+        # Расширение может быть недоступно (нет contrib или прав) - тогда префиксные индексы
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            trigram = True
+        except Exception:
+            trigram = False
+
+    for name, table, column in TRIGRAM_INDEXES:
+        if trigram:
+            sql = f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        elif connection.vendor == 'postgresql':
+            sql = f'CREATE INDEX IF NOT EXISTS {name} ON {table} (upper({column}::text) text_pattern_ops)'
+        else:
+            sql = f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)'
+        schema_editor.execute(sql)
+
+
+def drop_autocomplete_indexes(apps, schema_editor):
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_autocomplete_indexes, drop_autocomplete_indexes),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_attributes_index(apps, schema_editor):
+    # GIN по JSONB есть только в PostgreSQL (фильтры attributes @> {...} и фасеты)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS products_product_attributes_gin '
+        'ON products_product USING gin (attributes jsonb_path_ops)'
+    )
+
+
+def drop_attributes_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS products_product_attributes_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_attributes_index, drop_attributes_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_attributes_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='related_updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('shared_categories', models.PositiveSmallIntegerField(default=0)),
+                ('copurchase_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Похожие товары',
+                'indexes': [models.Index(fields=['product', '-score'], name='products_re_product_ebcd12_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'related'), name='unique_related_product'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copurchased_with', to='products.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copurchase_links', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Покупают вместе',
+                'indexes': [models.Index(fields=['product', '-orders_count'], name='products_pr_product_7eb0e6_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productcopurchase',
+            constraint=models.UniqueConstraint(fields=('product', 'other'), name='unique_product_copurchase'),
+        ),
+    ]
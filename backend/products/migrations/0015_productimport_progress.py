@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimport',
+            name='cancel_requested',
+            field=models.BooleanField(default=False, verbose_name='Запрошена отмена'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='estimated_finish_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Ожидаемое завершение'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Импорт без отметки дольше PRODUCT_IMPORT_STALE_AFTER считается прерванным', null=True, verbose_name='Последняя отметка воркера'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='processed_rows',
+            field=models.PositiveIntegerField(default=0, help_text='Строки до этой позиции уже записаны - с нее продолжается прерванный импорт', verbose_name='Обработано строк'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='rows_per_second',
+            field=models.FloatField(default=0, verbose_name='Строк в секунду'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начало обработки'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Воркер'),
+        ),
+        migrations.AlterField(
+            model_name='productimport',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('completed', 'Завершено'), ('partial', 'Частично завершено'), ('error', 'Ошибка'), ('cancelled', 'Отменено')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+    ]
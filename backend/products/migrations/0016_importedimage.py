@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_productimport_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000, unique=True, verbose_name='URL')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь в хранилище')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('checked_at', models.DateTimeField(verbose_name='Проверено')),
+            ],
+            options={
+                'verbose_name': 'Скачанное изображение',
+                'verbose_name_plural': 'Скачанные изображения',
+            },
+        ),
+    ]
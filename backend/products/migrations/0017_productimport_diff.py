@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_importedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimport',
+            name='diff_summary',
+            field=models.JSONField(blank=True, default=dict, help_text='Сколько обновленных товаров изменилось по каждому полю', verbose_name='Изменения по полям'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='dry_run',
+            field=models.BooleanField(default=False, help_text='Показать, что изменится, ничего не записывая', verbose_name='Пробный запуск'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='unchanged_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Без изменений'),
+        ),
+        migrations.AlterField(
+            model_name='productimportlog',
+            name='status',
+            field=models.CharField(choices=[('success', 'Успешно'), ('created', 'Создан'), ('updated', 'Обновлен'), ('error', 'Ошибка'), ('skipped', 'Пропущен'), ('unchanged', 'Без изменений')], max_length=20, verbose_name='Статус'),
+        ),
+    ]
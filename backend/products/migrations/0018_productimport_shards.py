@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_productimport_diff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimport',
+            name='shard_progress',
+            field=models.JSONField(blank=True, default=dict, help_text='Сколько своих строк записал каждый процесс (для продолжения)', verbose_name='Прогресс процессов'),
+        ),
+        migrations.AddField(
+            model_name='productimport',
+            name='shards',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Строки делятся между процессами по SKU (только PostgreSQL)', verbose_name='Параллельных процессов'),
+        ),
+    ]
@@ -1,9 +1,17 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.urls import reverse
+from django.utils import timezone
 
 
 class Category(models.Model):
+    # Ширина одного сегмента материализованного пути (id с ведущими нулями)
+    PATH_STEP = 10
+
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
@@ -23,6 +31,24 @@ class Category(models.Model):
     order = models.PositiveSmallIntegerField(default=0)
     meta_title = models.CharField(max_length=200, blank=True)
     meta_description = models.TextField(blank=True)
+
+    # Материализованный путь: id всех предков и самой категории,
+    # например "0000000001/0000000005/". Поддерживается автоматически в save()
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # Денормализованные счетчики доступных товаров (см. products/signals.py)
+    direct_product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Доступных товаров непосредственно в категории"
+    )
+    product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Доступных товаров в категории и активных подкатегориях"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -33,24 +59,186 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        # Нельзя сделать категорию дочерней для самой себя или своего потомка
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self._path_segment(self.pk) in parent_path.split('/'):
+                raise ValidationError({'parent': 'Нельзя переместить категорию внутрь самой себя'})
+
+    def save(self, *args, **kwargs):
+        # Для существующей категории путь пересчитывается до сохранения,
+        # чтобы обработчики post_save видели уже актуальное дерево
+        if self.pk:
+            self._update_path()
+        super().save(*args, **kwargs)
+        if not self.path:
+            self._update_path()
+
+    @classmethod
+    def _path_segment(cls, pk):
+        return f'{pk:0{cls.PATH_STEP}d}'
+
+    def _update_path(self):
+        """Пересчет пути категории и (при перемещении) всех ее потомков"""
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+        new_path = f'{parent_path}{self._path_segment(self.pk)}/'
+        self._previous_path = self.path
+        if new_path == self.path:
+            return
+
+        old_path, old_depth = self.path, self.depth
+        new_depth = new_path.count('/') - 1
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            # Переносим поддерево одним UPDATE: заменяем префикс пути
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        self.path, self.depth = new_path, new_depth
+
+    def get_ancestor_ids(self, include_self=False):
+        """id предков по материализованному пути (от корня), без запросов к БД"""
+        ids = [int(segment) for segment in self.path.split('/') if segment]
+        return ids if include_self else ids[:-1]
+
+    def get_ancestors(self, include_self=False):
+        """Предки категории от корня - один запрос"""
+        ids = self.get_ancestor_ids(include_self=include_self)
+        if not ids:
+            return []
+        return list(Category.objects.filter(pk__in=ids).order_by('depth'))
+
+    def get_breadcrumbs(self, category_map=None):
+        """Хлебные крошки от корня до текущей категории.
+
+        С category_map ({id: Category}) предки берутся из словаря без запросов.
+        """
+        if category_map is not None:
+            ancestors = [
+                category_map[pk] for pk in self.get_ancestor_ids(include_self=True)
+                if pk in category_map
+            ]
+        else:
+            ancestors = self.get_ancestors(include_self=True)
+        return [{'id': c.id, 'name': c.name, 'slug': c.slug} for c in ancestors]
+
     def get_full_path(self):
         """Полный путь категории (например: Электроника > Телефоны > Смартфоны)"""
-        path = []
-        current = self
-        while current:
-            path.append(current.name)
-            current = current.parent
-        return ' > '.join(reversed(path))
+        return ' > '.join(c.name for c in self.get_ancestors(include_self=True))
 
     def get_all_children(self, include_self=True):
-        """Получить все подкатегории рекурсивно"""
+        """Получить все активные подкатегории одним запросом по материализованному пути"""
+        descendants = Category.objects.filter(
+            path__startswith=self.path
+        ).exclude(pk=self.pk).order_by('path')
+
+        # Поддерево неактивной категории исключается целиком, как и раньше
         categories = [self] if include_self else []
-        for child in self.children.filter(is_active=True):
-            categories.extend(child.get_all_children(include_self=True))
+        reachable = {self.pk}
+        for category in descendants:
+            if category.is_active and category.parent_id in reachable:
+                reachable.add(category.pk)
+                categories.append(category)
         return categories
 
+    @classmethod
+    def refresh_product_counts(cls, category_ids):
+        """Пересчет счетчиков товаров для категорий и всех их предков"""
+        paths = cls.objects.filter(pk__in=category_ids).values_list('path', flat=True)
+        affected_ids = set()
+        for path in paths:
+            affected_ids.update(int(segment) for segment in path.split('/') if segment)
+        if not affected_ids:
+            return
+
+        direct_counts = dict(
+            cls.objects.filter(pk__in=affected_ids).annotate(
+                available=models.Count('products', filter=models.Q(products__is_available=True))
+            ).values_list('pk', 'available')
+        )
+        now = timezone.now()
+        for category in cls.objects.filter(pk__in=affected_ids).only('pk', 'path'):
+            total = Product.objects.filter(is_available=True).in_categories(
+                cls.objects.filter(is_active=True, path__startswith=category.path)
+            ).count()
+            direct = direct_counts.get(category.pk, 0)
+            # updated_at меняется только при изменении счетчиков (ETag категорий)
+            cls.objects.filter(pk=category.pk).exclude(
+                direct_product_count=direct, product_count=total
+            ).update(direct_product_count=direct, product_count=total, updated_at=now)
+
+    @classmethod
+    def rebuild_product_counts(cls):
+        """Полный пересчет счетчиков для всего дерева"""
+        cls.refresh_product_counts(cls.objects.values_list('pk', flat=True))
+
+    @classmethod
+    def get_category_map(cls):
+        """Все категории по id (минимум полей) - для хлебных крошек в списках товаров"""
+        return {c.id: c for c in cls.objects.only('id', 'name', 'slug', 'path')}
+
+    @classmethod
+    def get_children_map(cls):
+        """Активные категории, сгруппированные по parent_id - один запрос на все дерево"""
+        children_map = {}
+        for category in cls.objects.filter(is_active=True):
+            children_map.setdefault(category.parent_id, []).append(category)
+        return children_map
+
+
+class ProductQuerySet(models.QuerySet):
+    def in_categories(self, categories):
+        """
+        Товары хотя бы из одной категории (id, объекты или queryset категорий).
+        EXISTS по таблице связей вместо JOIN - дубликатов нет, DISTINCT не нужен.
+        """
+        through = Product.categories.through
+        return self.filter(models.Exists(
+            through.objects.filter(product_id=models.OuterRef('pk'), category__in=categories)
+        ))
+
+    def for_list(self):
+        """Связанные данные для ProductListSerializer - фиксированное число запросов на страницу"""
+        return self.select_related('main_category').prefetch_related('categories', 'images')
+
+    def top_per_category_group(self, groups, limit=5):
+        """
+        Первые limit товаров (в порядке Meta.ordering) для каждой группы категорий
+        одним запросом: groups - {ключ группы: [id категорий]}, результат -
+        {ключ группы: [id товаров]}. Каждая группа - отдельная ветка UNION ALL
+        с собственным ORDER BY ... LIMIT, поэтому планировщик выбирает план под
+        размер группы (индекс по дате для больших, связи категорий для малых).
+        """
+        ordering = [*self.model._meta.ordering, 'pk']
+        parts, params = [], []
+        for key, category_ids in groups.items():
+            if not category_ids:
+                continue
+            queryset = self.in_categories(category_ids).annotate(
+                group_key=Value(key)
+            ).order_by(*ordering).values_list('pk', 'group_key')[:limit]
+            sql, part_params = queryset.query.sql_with_params()
+            parts.append(f'SELECT * FROM ({sql}) AS group_{len(parts)}')
+            params.extend(part_params)
+
+        result = {key: [] for key in groups}
+        if not parts:
+            return result
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(' UNION ALL '.join(parts), params)
+            for product_id, key in cursor.fetchall():
+                result[key].append(product_id)
+        return result
+
 
 class Product(models.Model):
+    # Поля, при изменении которых список похожих товаров устаревает (и категории)
+    RELATED_FIELDS = ('price', 'main_category_id', 'is_available')
+
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     sku = models.CharField(
@@ -140,8 +328,18 @@ class Product(models.Model):
     height = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     depth = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     
+    # Поисковый индекс (tsvector), поддерживается в products/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Индекс - для max(updated_at) в ETag/Last-Modified (config/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Когда пересчитывались похожие товары (products/related.py);
+    # NULL - список устарел и будет пересчитан
+    related_updated_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at', '-is_featured', 'name']
@@ -149,12 +347,29 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['is_available', 'is_featured']),
-            models.Index(fields=['price']),
+            # Ключи keyset-пагинации: (поле сортировки, id)
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['name', 'id']),
         ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходную доступность, чтобы сигналы пересчитывали
+        # счетчики категорий только при ее изменении
+        instance._loaded_is_available = instance.__dict__.get('is_available')
+        # и поля, от которых зависят похожие товары (products/related.py)
+        instance._loaded_related = instance.get_related_state()
+        return instance
+
+    def get_related_state(self):
+        """Значения полей, влияющих на похожие товары (без запроса отложенных полей)"""
+        return tuple(self.__dict__.get(field) for field in self.RELATED_FIELDS)
+
     def save(self, *args, **kwargs):
         # Автогенерация SKU
         if not self.sku:
@@ -167,6 +382,12 @@ class Product(models.Model):
     @property
     def main_image(self):
         """Главное изображение товара"""
+        # Если изображения уже загружены через prefetch_related - выбираем без запросов
+        images = getattr(self, '_prefetched_objects_cache', {}).get('images')
+        if images is not None:
+            images = list(images)
+            main = next((image for image in images if image.is_main), None)
+            return main if main else (images[0] if images else None)
         main = self.images.filter(is_main=True).first()
         return main if main else self.images.first()
 
@@ -250,4 +471,61 @@ class ProductAttributeValue(models.Model):
         unique_together = ['product', 'attribute']
     
     def __str__(self):
-        return f"{self.product.name}: {self.attribute.name} = {self.value}"
\ No newline at end of file
+        return f"{self.product.name}: {self.attribute.name} = {self.value}"
+
+class RelatedProduct(models.Model):
+    """Предрасчитанные похожие товары (см. products/related.py)"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_links'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_to'
+    )
+    score = models.FloatField(default=0)
+    shared_categories = models.PositiveSmallIntegerField(default=0)
+    copurchase_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Похожие товары'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_related_product')
+        ]
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class ProductCoPurchase(models.Model):
+    """Товары, которые покупают вместе (см. products/copurchase.py)"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='copurchase_links'
+    )
+    other = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='copurchased_with'
+    )
+    orders_count = models.PositiveIntegerField(default=0)
+    # Косинусная близость: orders_count / sqrt(заказов с product * заказов с other)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Покупают вместе'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_product_copurchase')
+        ]
+        indexes = [
+            models.Index(fields=['product', '-orders_count']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id} ({self.orders_count})"
@@ -0,0 +1,148 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset-пагинация товаров: WHERE (поле, id) > (значение, id курсора)
+    вместо OFFSET и без COUNT(*). Ключ сортировки берется из ?ordering=.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    orderings = ['price', '-price', 'created_at', '-created_at', 'name', '-name']
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = request.query_params.get('ordering', self.default_ordering)
+        if ordering not in self.orderings:
+            ordering = self.default_ordering
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+        # Для ссылки "назад" идем по ключу в обратную сторону и разворачиваем страницу
+        scan_descending = self.descending != self.reverse
+
+        if cursor:
+            op = 'lt' if scan_descending else 'gt'
+            try:
+                value = queryset.model._meta.get_field(self.field).to_python(cursor['v'])
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            # Лишнее условие field >= / <= значения - граница диапазона индекса
+            # (поле, id): без него OR проверяется на каждой строке с начала индекса
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{op}e': value}),
+                Q(**{f'{self.field}__{op}': value}) |
+                Q(**{self.field: value, f'id__{op}': cursor['id']})
+            )
+
+        prefix = '-' if scan_descending else ''
+        results = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            int(cursor['id'])
+            cursor['v']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, obj, reverse=False):
+        value = getattr(obj, self.field)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        cursor = {'v': value, 'id': obj.pk}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CursorPaginationMixin:
+    """
+    Включает ProductCursorPagination по ?pagination=cursor (или при наличии ?cursor=)
+    для действий из cursor_pagination_actions, остальные - обычная пагинация.
+    """
+    cursor_pagination_actions = ['list']
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_cursor = self.action in self.cursor_pagination_actions and (
+                params.get('pagination') == 'cursor' or 'cursor' in params
+            )
+            if use_cursor:
+                self._paginator = ProductCursorPagination()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from config.response_cache import invalidate_cache_tags
+from .models import Product, RelatedProduct
+
+
+# Сколько похожих товаров хранится на товар (related отдает 8, карточка - 4)
+RELATED_LIMIT = getattr(settings, 'RELATED_PRODUCTS_LIMIT', 8)
+# Сколько кандидатов каждого вида оценивается перед отбором лучших
+RELATED_CANDIDATES = 50
+# Сколько устаревших списков воркер пересчитывает за раз
+RELATED_STALE_BATCH = 200
+# Веса составляющих оценки (каждая составляющая нормирована в 0..1)
+RELATED_WEIGHTS = {
+    'categories': 1.0,
+    'price': 0.5,
+    'copurchase': 2.0,
+    **getattr(settings, 'RELATED_PRODUCTS_WEIGHTS', {}),
+}
+
+
+def _category_candidates(product, category_ids):
+    """
+    Ближайшие по цене товары из тех же категорий: по RELATED_CANDIDATES / 2
+    дешевле и дороже. Оба запроса идут по индексу (price, id) с EXISTS по
+    категориям, а не группируют все товары категорий.
+    """
+    if not category_ids:
+        return []
+    queryset = Product.objects.filter(is_available=True).in_categories(category_ids).exclude(pk=product.pk)
+    half = RELATED_CANDIDATES // 2
+    cheaper = queryset.filter(price__lt=product.price).order_by('-price', '-id')
+    pricier = queryset.filter(price__gte=product.price).order_by('price', 'id')
+    return [
+        *cheaper.values_list('pk', flat=True)[:half],
+        *pricier.values_list('pk', flat=True)[:half],
+    ]
+
+
+def _copurchase_counts(product):
+    """Сколько заказов (кроме отмененных) содержат товар вместе с другими"""
+    from orders.models import OrderItem
+
+    orders = OrderItem.objects.filter(product_id=product.pk).exclude(
+        order__status='cancelled'
+    ).values('order_id')
+    rows = OrderItem.objects.filter(
+        order_id__in=orders, product__is_available=True
+    ).exclude(product_id=product.pk).values('product_id').annotate(
+        orders=Count('order_id', distinct=True)
+    ).order_by('-orders')[:RELATED_CANDIDATES]
+    return {row['product_id']: row['orders'] for row in rows}
+
+
+def compute_related(product):
+    """Оценки похожих товаров для одного товара - несколько агрегирующих запросов"""
+    category_ids = [category.pk for category in product.categories.all()]
+    copurchases = _copurchase_counts(product)
+    candidate_ids = set(_category_candidates(product, category_ids)) | set(copurchases)
+    if not candidate_ids:
+        return []
+
+    candidates = Product.objects.filter(pk__in=candidate_ids).annotate(
+        shared=Count('categories', filter=Q(categories__in=category_ids))
+    ).values_list('pk', 'price', 'shared')
+    max_copurchases = max(copurchases.values(), default=0)
+
+    rows = []
+    for pk, price, shared in candidates:
+        category_score = shared / len(category_ids) if category_ids else 0
+        top_price = max(price, product.price)
+        price_score = float(1 - abs(price - product.price) / top_price) if top_price else 1.0
+        copurchase_score = copurchases.get(pk, 0) / max_copurchases if max_copurchases else 0
+        score = (
+            RELATED_WEIGHTS['categories'] * category_score +
+            RELATED_WEIGHTS['price'] * price_score +
+            RELATED_WEIGHTS['copurchase'] * copurchase_score
+        )
+        rows.append(RelatedProduct(
+            product_id=product.pk,
+            related_id=pk,
+            score=score,
+            shared_categories=shared,
+            copurchase_count=copurchases.get(pk, 0),
+        ))
+    rows.sort(key=lambda row: (-row.score, row.related_id))
+    return rows[:RELATED_LIMIT]
+
+
+def refresh_related_products(product_ids):
+    """Пересчет таблицы похожих товаров для списка товаров"""
+    products = list(
+        Product.objects.filter(pk__in=product_ids).only('pk', 'price').prefetch_related('categories')
+    )
+    rows = []
+    for product in products:
+        rows.extend(compute_related(product))
+
+    ids = [product.pk for product in products]
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=ids).delete()
+        # Тот же товар мог параллельно пересчитать другой процесс
+        RelatedProduct.objects.bulk_create(rows, ignore_conflicts=True)
+        Product.objects.filter(pk__in=ids).update(related_updated_at=timezone.now())
+    invalidate_cache_tags(*(f'product:{pk}' for pk in ids))
+    return len(rows)
+
+
+def refresh_stale_related(batch_size=RELATED_STALE_BATCH):
+    """Пересчет пачки устаревших списков (воркер в простое); возвращает число товаров"""
+    product_ids = list(
+        Product.objects.filter(related_updated_at=None).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if product_ids:
+        refresh_related_products(product_ids)
+    return len(product_ids)
+
+
+def mark_related_stale(product_ids, include_referencing=True):
+    """
+    Пометить списки похожих товаров как устаревшие (пересчет - воркером
+    в простое или командой rebuild_related_products --stale). С include_referencing
+    помечаются и товары, в чьих списках эти товары уже есть.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    condition = Q(pk__in=product_ids)
+    if include_referencing:
+        condition |= Q(pk__in=RelatedProduct.objects.filter(
+            related_id__in=product_ids
+        ).values('product_id'))
+    # update() не вызывает сигналы и не трогает updated_at
+    Product.objects.filter(condition).exclude(related_updated_at=None).update(related_updated_at=None)
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    """
+    Похожие товары из предрасчитанной таблицы - только чтение, устаревший
+    список отдается до пересчета в фоне. Пока список не построен - товары
+    из тех же категорий, как до появления таблицы.
+    """
+    related = list(Product.objects.filter(
+        related_to__product=product, is_available=True
+    ).order_by('-related_to__score', 'pk').for_list()[:limit])
+    if related:
+        return related
+    return list(
+        Product.objects.filter(is_available=True).in_categories(product.categories.all())
+        .exclude(pk=product.pk).for_list()[:limit]
+    )
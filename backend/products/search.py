@@ -0,0 +1,140 @@
+import hashlib
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity, TrigramWordSimilarity
+)
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from .models import Category, Product
+
+
+# Конфигурации полнотекстового поиска PostgreSQL: каталог на русском и английском
+SEARCH_CONFIGS = ('russian', 'english')
+
+# Веса полей: name > sku > short_description > description
+SEARCH_FIELDS = (
+    ('name', 'A'),
+    ('short_description', 'C'),
+    ('description', 'D'),
+)
+
+
+def is_fulltext_available():
+    """Полнотекстовый поиск есть только на PostgreSQL (в SQLite - icontains)"""
+    return connection.vendor == 'postgresql'
+
+
+def search_vector_expression():
+    """Взвешенный tsvector товара по всем конфигурациям"""
+    vector = SearchVector('sku', weight='B', config='simple')
+    for config in SEARCH_CONFIGS:
+        for field, weight in SEARCH_FIELDS:
+            vector = vector + SearchVector(field, weight=weight, config=config)
+    return vector
+
+
+def update_search_vectors(product_ids):
+    """Пересчет Product.search_vector одним UPDATE"""
+    if not is_fulltext_available():
+        return
+    Product.objects.filter(pk__in=product_ids).update(search_vector=search_vector_expression())
+
+
+def build_search_query(query):
+    search_query = SearchQuery(query, config='simple', search_type='websearch')
+    for config in SEARCH_CONFIGS:
+        search_query = search_query | SearchQuery(query, config=config, search_type='websearch')
+    return search_query
+
+
+def search_products(queryset, query):
+    """Фильтр товаров по поисковой строке, отсортированный по релевантности"""
+    if not is_fulltext_available():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(sku__icontains=query)
+        ).order_by('-created_at', 'id')
+
+    search_query = build_search_query(query)
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', 'id')
+
+
+# Автодополнение: pg_trgm (опечатки) или префиксный поиск, если расширения нет
+AUTOCOMPLETE_CACHE_TIMEOUT = getattr(settings, 'AUTOCOMPLETE_CACHE_TIMEOUT', 60 * 5)
+AUTOCOMPLETE_MIN_TRIGRAM_LENGTH = 3
+
+_trigram_available = None
+
+
+def is_trigram_available():
+    """Установлено ли расширение pg_trgm (проверяется один раз на процесс)"""
+    global _trigram_available
+    if _trigram_available is None:
+        _trigram_available = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def _autocomplete_products(query, limit):
+    queryset = Product.objects.filter(is_available=True)
+    if is_trigram_available() and len(query) >= AUTOCOMPLETE_MIN_TRIGRAM_LENGTH:
+        # Все условия - операторы pg_trgm (GIN-индексы gin_trgm_ops из 0009): icontains
+        # (UPPER(...) LIKE) индекс не использует. Часть названия находит <% (word_similarity)
+        queryset = queryset.filter(
+            Q(name__trigram_similar=query) |
+            Q(sku__trigram_similar=query) |
+            Q(name__trigram_word_similar=query) |
+            Q(sku__trigram_word_similar=query)
+        ).annotate(
+            similarity=Greatest(
+                TrigramSimilarity('name', query), TrigramSimilarity('sku', query),
+                TrigramWordSimilarity(query, 'name'), TrigramWordSimilarity(query, 'sku'),
+            )
+        ).order_by('-similarity', 'name')
+    else:
+        queryset = queryset.filter(
+            Q(name__istartswith=query) | Q(sku__istartswith=query)
+        ).order_by('name')
+    products = list(queryset.values('id', 'name', 'slug', 'sku', 'price')[:limit])
+    for product in products:
+        # Цена строкой, как в сериализаторах товаров
+        product['price'] = str(product['price'])
+    return products
+
+
+def _autocomplete_categories(query, limit):
+    queryset = Category.objects.filter(is_active=True)
+    if is_trigram_available() and len(query) >= AUTOCOMPLETE_MIN_TRIGRAM_LENGTH:
+        queryset = queryset.filter(
+            Q(name__trigram_similar=query) | Q(name__trigram_word_similar=query)
+        ).annotate(
+            similarity=Greatest(TrigramSimilarity('name', query), TrigramWordSimilarity(query, 'name'))
+        ).order_by('-similarity', 'name')
+    else:
+        queryset = queryset.filter(name__istartswith=query).order_by('name')
+    return list(queryset.values('id', 'name', 'slug')[:limit])
+
+
+def autocomplete(query, limit=10):
+    """Подсказки для поиска по мере ввода, с кешем по нормализованному префиксу"""
+    query = ' '.join(query.split())
+    key = 'products:autocomplete:{}:{}'.format(
+        hashlib.md5(query.lower().encode('utf-8')).hexdigest(), limit
+    )
+    result = cache.get(key)
+    if result is None:
+        result = {
+            'products': _autocomplete_products(query, limit),
+            'categories': _autocomplete_categories(query, limit),
+        }
+        cache.set(key, result, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return result
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Category, Product, ProductImage, ProductAttribute, ProductAttributeValue
+from .related import get_related_products
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -11,28 +12,24 @@ class ProductImageSerializer(serializers.ModelSerializer):
 class CategoryTreeSerializer(serializers.ModelSerializer):
     """Сериализатор для дерева категорий"""
     children = serializers.SerializerMethodField()
-    product_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'image', 'children', 'product_count', 'is_active']
 
     def get_children(self, obj):
-        if obj.children.filter(is_active=True).exists():
+        # Если view передал карту дерева - строим поддерево без запросов к БД
+        children_map = self.context.get('children_map')
+        if children_map is not None:
+            children = children_map.get(obj.id, [])
+        else:
+            children = obj.children.filter(is_active=True)
+        if children:
             return CategoryTreeSerializer(
-                obj.children.filter(is_active=True), 
-                many=True
+                children, many=True, context={'children_map': children_map}
             ).data
         return []
 
-    def get_product_count(self, obj):
-        # Подсчет товаров в категории и подкатегориях
-        all_categories = obj.get_all_children(include_self=True)
-        return Product.objects.filter(
-            categories__in=all_categories,
-            is_available=True
-        ).distinct().count()
-
 
 class CategoryListSerializer(serializers.ModelSerializer):
     """Упрощенный сериализатор для списка"""
@@ -59,16 +56,7 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
     
     def get_breadcrumbs(self, obj):
         """Хлебные крошки для категории"""
-        crumbs = []
-        current = obj
-        while current:
-            crumbs.append({
-                'id': current.id,
-                'name': current.name,
-                'slug': current.slug
-            })
-            current = current.parent
-        return list(reversed(crumbs))
+        return obj.get_breadcrumbs()
 
 
 class ProductCategorySerializer(serializers.ModelSerializer):
@@ -80,8 +68,7 @@ class ProductCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'breadcrumbs']
     
     def get_breadcrumbs(self, obj):
-        return [{'id': c.id, 'name': c.name, 'slug': c.slug} 
-                for c in obj.get_all_children(include_self=False)]
+        return obj.get_breadcrumbs(self.context.get('category_map'))
 
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -105,10 +92,11 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
 
     def get_main_image(self, obj):
-        if obj.main_image:
+        main_image = obj.main_image
+        if main_image:
             return {
-                'url': obj.main_image.image.url,
-                'alt': obj.main_image.alt_text or obj.name
+                'url': main_image.image.url,
+                'alt': main_image.alt_text or obj.name
             }
         return None
 
@@ -143,12 +131,9 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_related_products(self, obj):
-        """Похожие товары из тех же категорий"""
-        related = Product.objects.filter(
-            categories__in=obj.categories.all(),
-            is_available=True
-        ).exclude(id=obj.id).distinct()[:4]
-        return ProductListSerializer(related, many=True).data
+        """Похожие товары (предрасчитанные, см. products/related.py)"""
+        related = get_related_products(obj, limit=4)
+        return ProductListSerializer(related, many=True, context=self.context).data
 
 
 class ProductFilterSerializer(serializers.Serializer):
@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Category, Product, ProductImage, ProductAttributeValue
+from .cache import bump_category_tree_version
+from .search import update_search_vectors
+from .related import mark_related_stale
+from config.response_cache import invalidate_cache_tags
+
+
+def _schedule_count_refresh(category_ids):
+    """Пересчет счетчиков и сброс кеша дерева после коммита транзакции"""
+    category_ids = set(category_ids)
+    if category_ids:
+        transaction.on_commit(lambda: _refresh_counts(category_ids))
+
+
+def _refresh_counts(category_ids):
+    Category.refresh_product_counts(category_ids)
+    bump_category_tree_version()
+    invalidate_cache_tags('categories')
+
+
+def _invalidate_products(product_ids):
+    """Сброс кеша ответов со списками и карточками этих товаров"""
+    invalidate_cache_tags('products', *(f'product:{pk}' for pk in product_ids if pk))
+
+
+def _invalidate_categories(*category_ids):
+    invalidate_cache_tags('categories', *(f'category:{pk}' for pk in category_ids if pk))
+
+
+def _touch_products(product_ids):
+    """
+    Обновить updated_at товаров при изменении связанных данных (категории,
+    изображения, характеристики) - на нем построены ETag/Last-Modified
+    """
+    product_ids = [pk for pk in product_ids if pk]
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+        _invalidate_products(product_ids)
+
+
+def _schedule_related_refresh(product_ids, include_referencing=True):
+    """Пометить похожие товары устаревшими после коммита транзакции"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: mark_related_stale(product_ids, include_referencing))
+
+
+def _related_state_changed(instance):
+    """
+    Изменились ли поля, от которых зависят похожие товары. Остаток и прочие
+    поля (списание при заказе) списки похожих не трогают
+    """
+    state = instance.get_related_state()
+    changed = getattr(instance, '_loaded_related', None) != state
+    instance._loaded_related = state
+    return changed
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    update_search_vectors([instance.pk])
+    if _related_state_changed(instance) or created:
+        _schedule_related_refresh([instance.pk])
+    _invalidate_products([instance.pk])
+    # Новый товар еще без категорий - их учтет m2m_changed
+    if created:
+        return
+    if getattr(instance, '_loaded_is_available', None) == instance.is_available:
+        return
+    instance._loaded_is_available = instance.is_available
+    _schedule_count_refresh(instance.categories.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Product)
+def product_pre_delete(sender, instance, **kwargs):
+    # Связи с категориями удаляются каскадно без m2m_changed - запоминаем заранее
+    instance._category_ids = list(instance.categories.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    _schedule_count_refresh(getattr(instance, '_category_ids', []))
+    _invalidate_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_ids = [instance.pk]
+        else:
+            instance._cleared_ids = list(instance.categories.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        _schedule_count_refresh(getattr(instance, '_cleared_ids', []))
+        if not reverse:
+            _touch_products([instance.pk])
+            _schedule_related_refresh([instance.pk])
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    # reverse=True: category.products.add(...), pk_set - id товаров
+    _schedule_count_refresh([instance.pk] if reverse else pk_set or [])
+    _touch_products((pk_set or []) if reverse else [instance.pk])
+    _schedule_related_refresh((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+def product_related_data_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _touch_products([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw=False, **kwargs):
+    transaction.on_commit(bump_category_tree_version)
+    # Карточки потомков и старого родителя помечены тегом самой категории
+    _invalidate_categories(instance.pk, instance.parent_id)
+    if raw or created:
+        return
+    # Перемещение или (де)активация меняют счетчики старых и новых предков
+    previous_path = getattr(instance, '_previous_path', '')
+    category_ids = instance.get_ancestor_ids(include_self=True)
+    category_ids += [int(segment) for segment in previous_path.split('/') if segment]
+    _schedule_count_refresh(category_ids)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    transaction.on_commit(bump_category_tree_version)
+    _invalidate_categories(instance.pk, instance.parent_id)
+    _schedule_count_refresh(instance.get_ancestor_ids())
+
+
+@receiver(post_save, sender='orders.OrderItem')
+@receiver(post_delete, sender='orders.OrderItem')
+def order_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Совместные покупки меняются только у товаров этого заказа
+    product_ids = sender.objects.filter(
+        order_id=instance.order_id, product__isnull=False
+    ).values_list('product_id', flat=True)
+    _schedule_related_refresh(
+        [*product_ids, instance.product_id] if instance.product_id else product_ids,
+        include_referencing=False
+    )
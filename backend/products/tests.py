@@ -0,0 +1,166 @@
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from products.export_service import ProductExportService
+from products.image_fetcher import ImageFetcher
+from products.import_models import ImportedImage, ProductImport
+from products.import_service import ProductImportService
+from products.models import Category, Product, ProductImage
+
+
+# PNG 1x1
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489'
+    '0000000d4944415478da63f8cfc0f01f0005000201e2217bc70000000049454e44ae426082'
+)
+
+
+class TempMediaMixin:
+    """Файлы импорта и изображений - во временном MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _import(self, content: str, **fields) -> ProductImport:
+        task = ProductImport(name='Тестовый импорт', import_type='create_update', **fields)
+        task.file.save('import.csv', ContentFile(content.encode('utf-8')), save=False)
+        task.save()
+        ProductImportService(task).process()
+        task.refresh_from_db()
+        return task
+
+
+class ExportImportRoundTripTest(TempMediaMixin, TestCase):
+    """Выгрузка (products/export_service.py) повторно импортируется без изменений"""
+
+    def setUp(self):
+        super().setUp()
+        # Категория из админки: slug задан вручную, не slugify(name)
+        self.phones = Category.objects.create(name='Телефоны', slug='telefony')
+        self.sale = Category.objects.create(name='Распродажа', slug='sale')
+        first = Product.objects.create(
+            name='Смартфон', slug='smartfon', sku='RT-1', description='Описание',
+            short_description='Коротко', price=Decimal('19990.00'), old_price=Decimal('24990.00'),
+            stock=5, is_featured=True, main_category=self.phones,
+        )
+        first.categories.set([self.phones, self.sale])
+        second = Product.objects.create(
+            name='Чехол', slug='chehol', sku='RT-2', description='', price=Decimal('990.00'),
+            stock=0, is_available=False, is_new=False, main_category=self.sale,
+        )
+        second.categories.set([self.sale])
+
+    def _state(self):
+        return [
+            (product.sku, product.main_category_id, sorted(product.categories.values_list('pk', flat=True)))
+            for product in Product.objects.order_by('sku')
+        ]
+
+    def test_csv_round_trip_is_unchanged(self):
+        before = self._state()
+        categories = Category.objects.count()
+
+        task = self._import(''.join(ProductExportService().iter_csv()))
+
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(
+            (task.created_count, task.updated_count, task.unchanged_count, task.error_count),
+            (0, 0, 2, 0),
+        )
+        self.assertEqual(Category.objects.count(), categories)
+        self.assertEqual(self._state(), before)
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Сервер изображений поставщика: ETag по пути, 304 на If-None-Match, задержка ответа"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stats = self.server.stats
+        with self.server.lock:
+            stats['active'] += 1
+            stats['max_active'] = max(stats['max_active'], stats['active'])
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            stats['active'] -= 1
+
+        etag = '"{}"'.format(hashlib.md5(self.path.encode('utf-8')).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            with self.server.lock:
+                stats['not_modified'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with self.server.lock:
+            stats['downloads'] += 1
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+
+class ImageFetcherTest(TempMediaMixin, TestCase):
+    """Скачивание изображений импорта (products/image_fetcher.py) с локального HTTP-сервера"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        self.server.stats = {'active': 0, 'max_active': 0, 'downloads': 0, 'not_modified': 0}
+        self.server.lock = threading.Lock()
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def test_duplicate_urls_fetched_once_and_reimport_uses_304(self):
+        shared = f'{self.base_url}/shared.png'
+        rows = [
+            f'IMG-1,Товар 1,100,{shared},{self.base_url}/one.png',
+            f'IMG-2,Товар 2,200,{shared},',
+            f'IMG-3,Товар 3,300,{shared},{self.base_url}/one.png',
+        ]
+        content = '\n'.join(['sku,name,price,image_1,image_2', *rows]) + '\n'
+
+        task = self._import(content)
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(self.server.stats['downloads'], 2)
+        self.assertEqual(ImportedImage.objects.count(), 2)
+        paths = set(ProductImage.objects.values_list('image', flat=True))
+        self.assertEqual(len(paths), 2)
+
+        # Повторный импорт: условные запросы, 304 - файлы не скачиваются заново
+        task = self._import(content, update_images=True)
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(self.server.stats['downloads'], 2)
+        self.assertEqual(self.server.stats['not_modified'], 2)
+        self.assertEqual(set(ProductImage.objects.values_list('image', flat=True)), paths)
+
+    def test_per_host_concurrency_is_bounded(self):
+        self.server.delay = 0.05
+        files = {f'{self.base_url}/{index}.png': f'{index}.png' for index in range(12)}
+        with ImageFetcher(workers=8, per_host=2) as fetcher:
+            results = fetcher.fetch_many(files)
+
+        self.assertFalse([url for url, path in results.items() if isinstance(path, Exception)])
+        self.assertEqual(self.server.stats['downloads'], 12)
+        self.assertLessEqual(self.server.stats['max_active'], 2)
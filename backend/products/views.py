@@ -2,9 +2,22 @@ from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count
-from .models import Category, Product
+from config.conditional import ConditionalGetMixin
+from config.response_cache import ResponseCacheMixin
+from .models import Category, Product, ProductCoPurchase, RelatedProduct
+from .cache import (
+    get_category_tree_json, get_category_flat_json,
+    build_products_by_category, get_products_by_category_json
+)
+from .search import search_products, autocomplete
+from .pagination import CursorPaginationMixin
+from .facets import filter_by_attributes, get_facets
+from .related import get_related_products
+from .copurchase import get_bought_together
+from .export_service import EXPORT_FORMATS, ProductExportService
 from .serializers import (
     CategoryTreeSerializer,
     CategoryListSerializer,
@@ -16,15 +29,34 @@ from .serializers import (
 )
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ResponseCacheMixin, ConditionalGetMixin, CursorPaginationMixin,
+                      viewsets.ReadOnlyModelViewSet):
     """
     Категории - только чтение для всех.
     Создание/редактирование/удаление только через Django Admin.
     """
+    cursor_pagination_actions = ['products']
+    conditional_models = [Category]
+    cache_tags = ['categories']
     queryset = Category.objects.filter(is_active=True)
     lookup_field = 'slug'
     permission_classes = [AllowAny]
 
+    def get_conditional_models(self):
+        if self.action == 'products':
+            return [Category, Product]
+        return self.conditional_models
+
+    def get_cache_tags(self, request, response):
+        if self.action == 'products':
+            return ['categories', 'products']
+        if self.action == 'retrieve':
+            # Карточка категории зависит только от себя, родителя, детей и предков
+            data = response.data
+            items = [data, data['parent'], *data['children'], *data['breadcrumbs']]
+            return sorted({f'category:{item["id"]}' for item in items if item})
+        return self.cache_tags
+
     def get_serializer_class(self):
         if self.action == 'list':
             return CategoryTreeSerializer
@@ -38,17 +70,24 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset.filter(parent=None)
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            # Все дерево одним запросом, дальше сериализатор не ходит в БД за детьми
+            context['children_map'] = Category.get_children_map()
+        elif self.action == 'products':
+            # Категории для хлебных крошек товаров одним запросом на весь ответ
+            context['category_map'] = Category.get_category_map()
+        return context
+
     @action(detail=False, methods=['get'])
     def tree(self, request):
-        root_categories = self.get_queryset().filter(parent=None)
-        serializer = CategoryTreeSerializer(root_categories, many=True)
-        return Response(serializer.data)
+        # Готовый JSON из кеша, пересобирается только при изменении дерева
+        return HttpResponse(get_category_tree_json(), content_type='application/json')
 
     @action(detail=False, methods=['get'])
     def flat(self, request):
-        categories = Category.objects.filter(is_active=True)
-        serializer = CategoryListSerializer(categories, many=True)
-        return Response(serializer.data)
+        return HttpResponse(get_category_flat_json(), content_type='application/json')
 
     @action(detail=True, methods=['get'])
     def products(self, request, slug=None):
@@ -56,9 +95,8 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         all_categories = category.get_all_children(include_self=True)
         
         queryset = Product.objects.filter(
-            categories__in=all_categories,
             is_available=True
-        ).distinct()
+        ).in_categories(all_categories).for_list()
         
         # Применяем фильтры из query params
         params = request.query_params
@@ -87,12 +125,13 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         if ordering in ['price', '-price', 'created_at', '-created_at', 'name', '-name']:
             queryset = queryset.order_by(ordering)
         
+        context = self.get_serializer_context()
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = ProductListSerializer(page, many=True)
+            serializer = ProductListSerializer(page, many=True, context=context)
             return self.get_paginated_response(serializer.data)
         
-        serializer = ProductListSerializer(queryset, many=True)
+        serializer = ProductListSerializer(queryset, many=True, context=context)
         
         return Response({
             'category': {
@@ -100,40 +139,68 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'name': category.name,
                 'slug': category.slug,
                 'description': category.description,
-                'breadcrumbs': self._get_breadcrumbs(category)
+                'breadcrumbs': category.get_breadcrumbs()
             },
             'products': serializer.data,
             'total_count': queryset.count()
         })
 
-    def _get_breadcrumbs(self, category):
-        crumbs = []
-        current = category
-        while current:
-            crumbs.append({
-                'id': current.id,
-                'name': current.name,
-                'slug': current.slug
-            })
-            current = current.parent
-        return list(reversed(crumbs))
-
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ResponseCacheMixin, ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     """
     Товары:
     - list, retrieve: доступно всем (AllowAny)
     - create, update, partial_update, destroy: только админ (IsAdminUser)
+    - ?pagination=cursor: keyset-пагинация без COUNT для list
     """
     queryset = Product.objects.filter(is_available=True)
     lookup_field = 'slug'
+    # Категории входят в ответ товаров (хлебные крошки, by_category)
+    conditional_models = [Product, Category]
+    cache_tags = ['products', 'categories']
+    # Действия со списками товаров - хлебные крошки из общей карты категорий
+    category_map_actions = [
+        'list', 'featured', 'new_arrivals', 'bestsellers', 'related', 'bought_together', 'search',
+    ]
+
+    def get_conditional_models(self):
+        if self.action == 'bought_together':
+            return [*self.conditional_models, ProductCoPurchase]
+        if self.action in ['retrieve', 'related']:
+            # Похожие товары пересчитываются воркером без изменения updated_at товаров
+            return [*self.conditional_models, RelatedProduct]
+        if self.action == 'export':
+            # Выгрузка зависит и от изображений, и от связей с категориями - всегда заново
+            return []
+        return self.conditional_models
+
+    def get_cache_tags(self, request, response):
+        if self.action not in ['retrieve', 'related', 'bought_together']:
+            return self.cache_tags
+        # Карточка и подборки сбрасываются только при изменении своих товаров
+        data = response.data
+        if isinstance(data, list):
+            items = [{'id': self._cache_product_id}, *data]
+        else:
+            items = [data, *data.get('related_products', [])]
+        tags = {f'product:{item["id"]}' for item in items}
+        tags.add('categories')
+        if self.action == 'bought_together':
+            tags.add('copurchase')
+        return sorted(tags)
+
+    def get_object(self):
+        product = super().get_object()
+        self._cache_product_id = product.pk
+        return product
     
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
         """
         if self.action in ['list', 'retrieve', 'featured', 'new_arrivals', 
-                          'bestsellers', 'by_category', 'related', 'search']:
+                          'bestsellers', 'by_category', 'related', 'search',
+                          'autocomplete', 'facets', 'bought_together']:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -146,6 +213,13 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductDetailSerializer
         return ProductListSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.category_map_actions:
+            # Категории для хлебных крошек товаров одним запросом на весь ответ
+            context['category_map'] = Category.get_category_map()
+        return context
+
     def get_queryset(self):
         # Для админов показываем все товары, для остальных только доступные
         if self.request.user.is_staff:
@@ -157,11 +231,11 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         category_slug = params.get('category')
         if category_slug:
-            queryset = queryset.filter(categories__slug=category_slug)
+            queryset = queryset.in_categories(Category.objects.filter(slug=category_slug))
         
         category_id = params.get('category_id')
         if category_id:
-            queryset = queryset.filter(categories__id=category_id)
+            queryset = queryset.in_categories([category_id])
         
         if params.get('in_stock') == 'true':
             queryset = queryset.filter(stock__gt=0)
@@ -180,35 +254,34 @@ class ProductViewSet(viewsets.ModelViewSet):
         if params.get('is_bestseller') == 'true':
             queryset = queryset.filter(is_bestseller=True)
         
+        queryset = filter_by_attributes(queryset, params)
+        
         search = params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(short_description__icontains=search) |
-                Q(sku__icontains=search)
-            )
+            # Без явной сортировки результаты поиска идут по релевантности
+            queryset = search_products(queryset, search)
         
-        ordering = params.get('ordering', '-created_at')
+        ordering = params.get('ordering', None if search else '-created_at')
         if ordering in ['price', '-price', 'created_at', '-created_at', 'name', '-name']:
             queryset = queryset.order_by(ordering)
         
-        return queryset.distinct()
+        return queryset.for_list()
 
     def retrieve(self, request, *args, **kwargs):
         lookup_value = kwargs.get(self.lookup_field)
+        products = Product.objects.for_list()
         
         try:
             product_id = int(lookup_value)
             if request.user.is_staff:
-                product = get_object_or_404(Product, pk=product_id)
+                product = get_object_or_404(products, pk=product_id)
             else:
-                product = get_object_or_404(Product, pk=product_id, is_available=True)
+                product = get_object_or_404(products, pk=product_id, is_available=True)
         except (ValueError, TypeError):
             if request.user.is_staff:
-                product = get_object_or_404(Product, slug=lookup_value)
+                product = get_object_or_404(products, slug=lookup_value)
             else:
-                product = get_object_or_404(Product, slug=lookup_value, is_available=True)
+                product = get_object_or_404(products, slug=lookup_value, is_available=True)
         
         serializer = self.get_serializer(product)
         return Response(serializer.data)
@@ -216,52 +289,42 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def featured(self, request):
         featured = self.get_queryset().filter(is_featured=True)[:10]
-        serializer = ProductListSerializer(featured, many=True)
+        serializer = self.get_serializer(featured, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def new_arrivals(self, request):
         new_products = self.get_queryset().filter(is_new=True)[:10]
-        serializer = ProductListSerializer(new_products, many=True)
+        serializer = self.get_serializer(new_products, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def bestsellers(self, request):
         bestsellers = self.get_queryset().filter(is_bestseller=True)[:10]
-        serializer = ProductListSerializer(bestsellers, many=True)
+        serializer = self.get_serializer(bestsellers, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        categories = Category.objects.filter(is_active=True, parent=None)
-        
-        result = []
-        for category in categories:
-            products = Product.objects.filter(
-                categories__in=category.get_all_children(include_self=True),
-                is_available=True
-            ).distinct()[:5]
-            
-            result.append({
-                'category': {
-                    'id': category.id,
-                    'name': category.name,
-                    'slug': category.slug
-                },
-                'products': ProductListSerializer(products, many=True).data
-            })
-        
-        return Response(result)
+        if request.user.is_authenticated:
+            return Response(build_products_by_category())
+        return HttpResponse(get_products_by_category_json(), content_type='application/json')
 
     @action(detail=True, methods=['get'])
     def related(self, request, slug=None):
         product = self.get_object()
-        related = Product.objects.filter(
-            categories__in=product.categories.all(),
-            is_available=True
-        ).exclude(id=product.id).distinct()[:8]
-        
-        serializer = ProductListSerializer(related, many=True)
+        related = get_related_products(product)
+
+        serializer = self.get_serializer(related, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def bought_together(self, request, slug=None):
+        """Товары, которые покупают вместе с этим (build_copurchase_matrix)"""
+        product = self.get_object()
+        products = get_bought_together(product)
+
+        serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -274,15 +337,63 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        products = self.get_queryset().filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(categories__name__icontains=query)
-        ).distinct()[:20]
+        products = search_products(self.get_queryset(), query)
+        
+        page = self.paginate_queryset(products)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+            response.data['query'] = query
+            return response
         
-        serializer = ProductListSerializer(products, many=True)
+        serializer = self.get_serializer(products, many=True)
         return Response({
             'query': query,
             'count': len(serializer.data),
             'results': serializer.data
-        })
\ No newline at end of file
+        })
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Подсказки при вводе поискового запроса"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Parameter "q" is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 20)
+        except ValueError:
+            limit = 10
+        
+        return Response({
+            'query': query,
+            **autocomplete(query, max(limit, 1))
+        })
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Счетчики для фильтров каталога с учетом текущих фильтров
+        (те же query params, что и у списка товаров)
+        """
+        return Response(get_facets(
+            self.get_queryset(),
+            request.query_params,
+            is_staff=request.user.is_staff
+        ))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Выгрузка товаров в формате импорта (только админ): ?type=csv|xlsx|jsonl
+        и те же фильтры, что у списка товаров. Файл отдается потоково.
+        """
+        export_format = request.query_params.get('type', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Unsupported export type. Use one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return ProductExportService(self.get_queryset()).response(export_format)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class SiteSettingsConfig(AppConfig):  # Имя класса изменено
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'site_settings'  # Без apps. и без конфликта со встроенным settings
-    verbose_name = 'Настройки сайта'
\ No newline at end of file
+    verbose_name = 'Настройки сайта'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import time
+from datetime import datetime, timezone
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from .models import SiteSetting
+from .serializers import SiteSettingDetailSerializer
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli снимок отдается только в gzip
+    brotli = None
+
+
+SETTINGS_VERSION_KEY = 'site_settings:version'
+SETTINGS_SNAPSHOT_KEY = 'site_settings:snapshot:{}'
+# Снимки старых версий не нужны - истекают сами
+SETTINGS_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# Копия активных настроек и снимка в памяти процесса
+_registry = {'version': None, 'settings': {}, 'snapshot': None}
+
+
+class LoadedSetting:
+    """Настройка из реестра: значение и полные данные уже вычислены при загрузке"""
+    __slots__ = ('key', 'value', 'detail')
+
+    def __init__(self, setting):
+        self.key = setting.key
+        self.value = setting.get_value()
+        self.detail = dict(SiteSettingDetailSerializer(setting).data)
+
+
+def get_settings_version():
+    """
+    Версия настроек - время последнего изменения в наносекундах,
+    общая для всех воркеров через cache
+    """
+    version = cache.get(SETTINGS_VERSION_KEY)
+    if version is None:
+        cache.add(SETTINGS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(SETTINGS_VERSION_KEY, time.time_ns())
+    return version
+
+
+def bump_settings_version():
+    """Инвалидация реестра во всех воркерах"""
+    cache.set(SETTINGS_VERSION_KEY, time.time_ns(), None)
+
+
+def get_settings_modified():
+    """Время последнего изменения настроек (для Last-Modified)"""
+    return datetime.fromtimestamp(get_settings_version() / 1e9, timezone.utc)
+
+
+def get_settings():
+    """
+    Все активные настройки {key: LoadedSetting}. Загружаются одним запросом
+    при первом обращении и после изменения версии, дальше - из памяти процесса.
+    """
+    version = get_settings_version()
+    if _registry['version'] != version:
+        settings = SiteSetting.objects.filter(is_active=True).order_by('pk')
+        _registry['settings'] = {setting.key: LoadedSetting(setting) for setting in settings}
+        _registry['version'] = version
+    return _registry['settings']
+
+
+def get_setting(key):
+    """LoadedSetting по ключу или None"""
+    return get_settings().get(key)
+
+
+def get_setting_value(key, default=None):
+    """Типизированное значение настройки (bool/float/url картинки/строка)"""
+    setting = get_setting(key)
+    return default if setting is None else setting.value
+
+
+def get_settings_by_prefix(prefix):
+    return {key: setting for key, setting in get_settings().items() if key.startswith(prefix)}
+
+
+def build_settings_snapshot():
+    """
+    Снимок всех активных настроек: JSON {key: данные настройки}, сжатый
+    заранее. Возвращает {'etag': ..., 'identity': ..., 'gzip': ..., 'br': ...}
+    """
+    content = JSONRenderer().render({key: s.detail for key, s in get_settings().items()})
+    snapshot = {
+        'etag': '"{}"'.format(hashlib.md5(content).hexdigest()),
+        'identity': content,
+        'gzip': gzip.compress(content, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        snapshot['br'] = brotli.compress(content, quality=11)
+    return snapshot
+
+
+def get_settings_snapshot():
+    """
+    Готовый снимок настроек. Собирается один раз на версию (общий кеш),
+    затем хранится в памяти процесса до следующего изменения.
+    """
+    version = get_settings_version()
+    local = _registry['snapshot']
+    if local and local[0] == version:
+        return local[1]
+
+    key = SETTINGS_SNAPSHOT_KEY.format(version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_settings_snapshot()
+        cache.set(key, snapshot, SETTINGS_SNAPSHOT_TIMEOUT)
+    _registry['snapshot'] = (version, snapshot)
+    return snapshot
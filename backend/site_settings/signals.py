@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from config.response_cache import invalidate_cache_tags
+from .models import SiteSetting
+from .registry import bump_settings_version
+
+
+@receiver(post_save, sender=SiteSetting)
+@receiver(post_delete, sender=SiteSetting)
+def site_setting_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_settings_version)
+    invalidate_cache_tags('settings')
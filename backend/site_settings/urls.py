@@ -5,7 +5,8 @@ from .views import SiteSettingViewSet, HomePageSettingsView
 router = DefaultRouter()
 router.register(r'', SiteSettingViewSet, basename='setting')
 
+# homepage/ раньше роутера - иначе его перехватывает маршрут детальной настройки
 urlpatterns = [
-    path('', include(router.urls)),
     path('homepage/', HomePageSettingsView.as_view(), name='homepage-settings'),
+    path('', include(router.urls)),
 ]
\ No newline at end of file
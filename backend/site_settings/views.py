@@ -1,8 +1,16 @@
+import re
 from rest_framework import viewsets, views, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from config.conditional import ConditionalGetMixin
+from config.response_cache import ResponseCacheMixin
 from .models import SiteSetting
+from .registry import (
+    get_settings, get_setting, get_settings_by_prefix,
+    get_settings_version, get_settings_modified, get_settings_snapshot
+)
 from .serializers import (
     SiteSettingSerializer, 
     SiteSettingDetailSerializer,
@@ -10,13 +18,34 @@ from .serializers import (
 )
 
 
-class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
+re_accepts_brotli = re.compile(r'\bbr\b')
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class SettingsConditionalMixin(ConditionalGetMixin):
+    """ETag по версии реестра настроек - проверка без запросов к БД"""
+    conditional_models = [SiteSetting]
+
+    def get_conditional_fingerprint(self):
+        return f'settings:{get_settings_version()}', get_settings_modified()
+
+
+class SiteSettingViewSet(ResponseCacheMixin, SettingsConditionalMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для работы с настройками сайта.
+    Чтение идет из реестра настроек в памяти процесса (registry.py).
     """
     queryset = SiteSetting.objects.filter(is_active=True)
     serializer_class = SiteSettingSerializer
     lookup_field = 'key'
+    cache_tags = ['settings']
+    cache_exempt_actions = ['snapshot']
+
+    def get_conditional_fingerprint(self):
+        # У снимка свой ETag по содержимому (для каждого сжатия)
+        if self.action == 'snapshot':
+            return None
+        return super().get_conditional_fingerprint()
 
     def get_serializer_class(self):
         """Для retrieve возвращаем полные данные"""
@@ -24,20 +53,26 @@ class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
             return SiteSettingDetailSerializer
         return SiteSettingSerializer
 
-    def get_queryset(self):
-        """Фильтрация по query параметрам keys или key"""
-        queryset = super().get_queryset()
+    def _get_requested_settings(self):
+        """Настройки из реестра с фильтром по query параметрам keys или key"""
+        settings = list(get_settings().values())
         
         keys_param = self.request.query_params.get('keys')
         if keys_param:
-            keys = [k.strip() for k in keys_param.split(',')]
-            queryset = queryset.filter(key__in=keys)
+            keys = {k.strip() for k in keys_param.split(',')}
+            settings = [s for s in settings if s.key in keys]
         
         single_key = self.request.query_params.get('key')
         if single_key:
-            queryset = queryset.filter(key=single_key)
+            settings = [s for s in settings if s.key == single_key]
             
-        return queryset
+        return settings
+
+    def retrieve(self, request, *args, **kwargs):
+        setting = get_setting(kwargs[self.lookup_field])
+        if setting is None:
+            raise Http404
+        return Response(setting.detail)
 
     def list(self, request, *args, **kwargs):
         """
@@ -45,23 +80,50 @@ class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
         GET /api/settings/?keys=site_name,home_hero_title - фильтр по ключам
         GET /api/settings/?key=site_name - одна настройка
         """
-        queryset = self.get_queryset()
+        settings = self._get_requested_settings()
         
         # Если запрошены конкретные ключи - возвращаем только key-value для совместимости
         if request.query_params.get('keys') or request.query_params.get('key'):
             data = {}
-            for setting in queryset:
+            for setting in settings:
                 data[setting.key] = {
-                    'value': setting.get_value(),
-                    'name': setting.name,
-                    'type': setting.type,
-                    'description': setting.description,
+                    'value': setting.value,
+                    'name': setting.detail['name'],
+                    'type': setting.detail['type'],
+                    'description': setting.detail['description'],
                 }
             return Response(data)
         
         # По умолчанию возвращаем полные данные всех настроек
-        serializer = SiteSettingDetailSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response([setting.detail for setting in settings])
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """
+        GET /api/settings/snapshot/
+        Все активные настройки одним готовым JSON {key: данные настройки}.
+        Собирается и сжимается (gzip, brotli) только при изменении настроек.
+        """
+        snapshot = get_settings_snapshot()
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if 'br' in snapshot and re_accepts_brotli.search(accept_encoding):
+            encoding = 'br'
+        elif re_accepts_gzip.search(accept_encoding):
+            encoding = 'gzip'
+        else:
+            encoding = 'identity'
+        # Разные сжатия - разные представления, ETag у каждого свой
+        etag = snapshot['etag'] if encoding == 'identity' else f'{snapshot["etag"][:-1]}-{encoding}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(snapshot[encoding], content_type='application/json')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, no_cache=True)
+        return response
 
     @action(detail=False, methods=['post'])
     def bulk(self, request):
@@ -73,14 +135,14 @@ class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         keys = serializer.get_keys_list()
-        settings = SiteSetting.objects.filter(key__in=keys, is_active=True)
+        settings = [s for s in get_settings().values() if s.key in keys]
         
         # Проверяем какие ключи не найдены
         found_keys = {s.key for s in settings}
         not_found = set(keys) - found_keys
         
         result = {
-            'data': {setting.key: SiteSettingDetailSerializer(setting).data for setting in settings},
+            'data': {setting.key: setting.detail for setting in settings},
             'found': list(found_keys),
             'not_found': list(not_found) if not_found else None
         }
@@ -105,10 +167,12 @@ class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        setting = get_object_or_404(SiteSetting, key=key, is_active=True)
+        setting = get_setting(key)
+        if setting is None:
+            raise Http404
         
         # Возвращаем полные данные
-        return Response(SiteSettingDetailSerializer(setting).data)
+        return Response(setting.detail)
 
     @action(detail=False, methods=['get'])
     def group(self, request):
@@ -122,31 +186,32 @@ class SiteSettingViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        settings = SiteSetting.objects.filter(key__startswith=prefix, is_active=True)
+        settings = get_settings_by_prefix(prefix)
         
         return Response({
             'prefix': prefix,
-            'count': settings.count(),
-            'settings': {s.key: SiteSettingDetailSerializer(s).data for s in settings}
+            'count': len(settings),
+            'settings': {key: s.detail for key, s in settings.items()}
         })
 
 
-class HomePageSettingsView(views.APIView):
+class HomePageSettingsView(ResponseCacheMixin, SettingsConditionalMixin, views.APIView):
     """Конечная точка для получения настроек главной страницы"""
-    
+    cache_tags = ['settings']
+
     def get(self, request):
         # Получаем настройки с префиксом 'home_'
-        home_settings = SiteSetting.objects.filter(key__startswith='home_', is_active=True)
+        home_settings = get_settings_by_prefix('home_')
         
         # Дополнительные ключи
         extra_keys_param = request.query_params.get('extra')
         extra_settings = None
         if extra_keys_param:
             extra_keys = [k.strip() for k in extra_keys_param.split(',')]
-            extra_settings_qs = SiteSetting.objects.filter(key__in=extra_keys, is_active=True)
-            extra_settings = {s.key: SiteSettingDetailSerializer(s).data for s in extra_settings_qs}
+            settings = get_settings()
+            extra_settings = {key: settings[key].detail for key in extra_keys if key in settings}
         
         return Response({
-            'home_settings': {s.key: SiteSettingDetailSerializer(s).data for s in home_settings},
+            'home_settings': {key: s.detail for key, s in home_settings.items()},
             'extra_settings': extra_settings
         })
\ No newline at end of file